@@ -1 +1,15 @@
-from .geostring import *
\ No newline at end of file
+from .geostring import *
+from .batch import resolve_many, resolver_pool
+from .extract import extract_places, resolve_text
+from .fuzzy import (FUZZY_ENGINES, ExhaustiveIndex, PartitionIndex,
+                    SymDeleteIndex)
+from .gazetteer import Gazetteer, GazetteerIndex, load_gazetteer
+from .regions import RegionView
+from .shared import SharedIndex, export_shared_index, open_shared_index
+
+def __getattr__(name):
+    # the asyncio service is only imported when it is first used
+    if name == 'AsyncResolver':
+        from .service import AsyncResolver
+        return AsyncResolver
+    raise AttributeError("module 'geostring' has no attribute '" + name + "'")
\ No newline at end of file
@@ -0,0 +1,185 @@
+import collections
+import multiprocessing
+import os
+from . import profiling
+from .fuzzy import get_fuzzy_index, max_edit_distance
+from .geostring import (DEFAULT_DELIMITERS, Geostring, make_geodict,
+                        match_segment, preprocess, resolve_results,
+                        segment_cache, split_segments)
+from .places import get_place_store
+
+RESOLVED_COLUMNS = ['resolved_city',
+                    'resolved_subcountry',
+                    'resolved_country']
+
+# location index of the current pool worker, set by _init_worker
+_worker_loc_index = None
+
+def _init_worker(loc_index,options=None):
+    # under the fork start method the index is inherited from the parent
+    # rather than pickled, so every worker shares the loaded copy; with
+    # options (resolve_many's), the worker also warms up for them
+    global _worker_loc_index
+    _worker_loc_index = loc_index
+    if options is not None:
+        _warm_up(loc_index,options)
+
+def _warm_up(loc_index,options):
+    # builds the fuzzy engine and the place store (used once two segments
+    # match) that resolving with options needs, instead of leaving them to
+    # the first fuzzy or multi-segment input
+    if options.get('exact',False) == False:
+        get_fuzzy_index(loc_index,options.get('engine','partition'))
+    get_place_store(loc_index,options.get('re_sub','[^a-z]'))
+
+def _match_chunk(args):
+    segments,exact,max_tolerance,engine = args
+    return [match_segment(i,_worker_loc_index,exact,max_tolerance,engine)
+            for i
+            in segments]
+
+def _resolve_chunk(args):
+    # a whole resolve_many call in a pool worker; returns its stats too
+    loc_strings,options = args
+    stats = {}
+    results = resolve_many(loc_strings,
+                           loc_index=_worker_loc_index,
+                           stats=stats,
+                           **options)
+    return results,stats
+
+def resolver_pool(workers,loc_index=''):
+    # a process pool whose workers hold loc_index; pass it to resolve_many
+    # via pool= to reuse it across calls
+    if loc_index == '':
+        loc_index = Geostring.loc_index
+    return multiprocessing.Pool(workers,
+                                initializer=_init_worker,
+                                initargs=(loc_index,))
+
+def _is_series(obj):
+    return (type(obj).__module__.split('.')[0] == 'pandas'
+            and type(obj).__name__ == 'Series')
+
+def resolve_many(loc_strings,
+                 exact=False,
+                 max_tolerance=0.25,
+                 delimiters=DEFAULT_DELIMITERS,
+                 re_sub='[^a-z]',
+                 loc_index='',
+                 engine='partition',
+                 workers=1,
+                 chunksize=None,
+                 pool=None,
+                 stats=None):
+    # Resolves many location strings at once, returning what resolve would
+    # return for each of them in input order. Repeated inputs and segments
+    # are matched only once, and unique fuzzy segments can be spread over
+    # a process pool. A pandas Series returns a DataFrame with one
+    # resolved_* column per level and the Series' index. If stats is a
+    # dict, input and segment counts are added to it.
+    series = loc_strings if _is_series(loc_strings) else None
+    loc_strings = list(loc_strings)
+    if exact == True:
+        max_tolerance = 0
+    if loc_index == '':
+        loc_index = Geostring.loc_index
+
+    # split and preprocess each distinct input once; inputs that reduce to
+    # the same preprocessed segments resolve identically
+    started = profiling.start()
+    input_keys = {}
+    for i in loc_strings:
+        if isinstance(i,str) and i not in input_keys:
+            input_keys[i] = tuple(preprocess(s,re_sub)
+                                  for s
+                                  in split_segments(i,delimiters))
+    profiling.stop('normalization',started)
+    segments = {}
+    for i in input_keys.values():
+        for s in i:
+            segments[s] = None
+
+    # exact hits are cheap dict lookups; everything else is a fuzzy search
+    # unless this process has already cached it
+    fuzzy_segments = []
+    cache_keys = {}
+    for s in segments:
+        if s in loc_index:
+            segments[s] = (s,0)
+        elif exact == True:
+            segments[s] = (None,1)
+        else:
+            cache_keys[s] = segment_cache.key(
+                s,
+                loc_index,
+                max_edit_distance(len(s),max_tolerance))
+            segments[s] = segment_cache.get(cache_keys[s])
+            if segments[s] is None:
+                fuzzy_segments.append(s)
+    if len(fuzzy_segments) > 0:
+        if workers > 1 or pool is not None:
+            own_pool = pool is None
+            if own_pool:
+                pool = resolver_pool(workers,loc_index)
+            try:
+                if chunksize is None:
+                    n_workers = workers if own_pool else os.cpu_count() or 1
+                    chunksize = max(len(fuzzy_segments)//(n_workers*4),1)
+                # workers do not report to this process's profile, so the
+                # whole parallel search is timed as one stage
+                started = profiling.start()
+                chunks = [fuzzy_segments[n:n+chunksize]
+                          for n
+                          in range(0,len(fuzzy_segments),chunksize)]
+                matches = pool.map(_match_chunk,
+                                   [(i,exact,max_tolerance,engine)
+                                    for i
+                                    in chunks])
+                profiling.stop('candidate_search',started)
+                profiling.count('parallel_searches',len(fuzzy_segments))
+            finally:
+                if own_pool:
+                    pool.close()
+                    pool.join()
+            for chunk,chunk_matches in zip(chunks,matches):
+                for s,m in zip(chunk,chunk_matches):
+                    segments[s] = m
+                    segment_cache.put(cache_keys[s],m)
+        else:
+            for s in fuzzy_segments:
+                segments[s] = match_segment(s,loc_index,exact,
+                                            max_tolerance,engine,
+                                            cache_keys[s])
+
+    resolved = {}
+    for i in input_keys.values():
+        if i not in resolved:
+            results = [make_geodict(s,s,segments[s],loc_index) for s in i]
+            resolved[i] = resolve_results(results,
+                                          max_tolerance,
+                                          loc_index,
+                                          re_sub)
+    output = []
+    n_segments = 0
+    for i in loc_strings:
+        if isinstance(i,str):
+            n_segments += len(input_keys[i])
+        if isinstance(i,str) and resolved[input_keys[i]] is not None:
+            output.append(collections.OrderedDict(resolved[input_keys[i]]))
+        else:
+            output.append(None)
+    if stats is not None:
+        for k,v in [('inputs',len(loc_strings)),
+                    ('unique_inputs',len(input_keys)),
+                    ('segments',n_segments),
+                    ('unique_segments',len(segments)),
+                    ('fuzzy_searches',len(fuzzy_segments))]:
+            stats[k] = stats.get(k,0) + v
+
+    if series is not None:
+        import pandas as pd
+        return pd.DataFrame([i if i is not None else {} for i in output],
+                            index=series.index,
+                            columns=RESOLVED_COLUMNS)
+    return output
@@ -0,0 +1,237 @@
+import argparse
+import collections
+import json
+import random
+import string
+import subprocess
+import sys
+import time
+import tracemalloc
+from . import profiling
+from .batch import resolve_many
+from .fuzzy import FUZZY_ENGINES
+from .geostring import (Geostring, create_loc_index, data_path,
+                        default_loc_index, get_geo_info, load_loc_index,
+                        read_places_csv, resolve, segment_cache,
+                        split_segments)
+
+# Reproducible benchmarks for geostring. The corpus is sampled from the
+# bundled place and nickname files with a fixed seed, so the same data
+# gives the same corpus on every run. Run with python -m geostring.benchmark.
+
+FIXED_CASES = {'exact':['chapel hill','omaha','brussels','north carolina',
+                        'queensland','kenya','mongolia','paraguay'],
+               'fuzzy':['brookln','chicgo','lodnon','philly delphia',
+                        'sanfransisco','zurik','torronto','melborne'],
+               'compound':['springfield, oh','athens, greece','san juan, pr',
+                           'oxford, uk','oxford, usa','VA/MD',
+                           'paris; texas','london & ontario'],
+               'nickname':['nyc','la','windy city','philly','usa','uk',
+                           'socal','big easy'],
+               'garbage':['wakanda','westeros','narnia','the moon',
+                          'everywhere','asdfghjkl','worldwide','home']}
+
+def mutate(word,rng,edits):
+    letters = string.ascii_lowercase
+    word = list(word)
+    for n in range(edits):
+        op = rng.random()
+        pos = rng.randrange(max(len(word),1))
+        if op < 0.33 and len(word) > 1:
+            del word[pos]
+        elif op < 0.66 and len(word) > 0:
+            word[pos] = rng.choice(letters)
+        else:
+            word.insert(pos,rng.choice(letters))
+    return ''.join(word)
+
+def build_corpus(n=200,seed=0):
+    rng = random.Random(seed)
+    places = read_places_csv(data_path('world_places.csv'))
+    nicknames = read_places_csv(data_path('world_nicknames.csv'))
+    names = sorted({i[0] for i in places} |
+                   {i[1] for i in places} |
+                   {i[2] for i in places})
+    abbrevs = {}
+    for i in nicknames:
+        if len(i[0]) <= 3 and i[1] == '' and i[3] != '':
+            abbrevs.setdefault(i[3],i[0])
+    corpus = collections.OrderedDict()
+    corpus['exact'] = [rng.choice(names) for x in range(n)]
+    corpus['fuzzy'] = [mutate(rng.choice(names),rng,rng.randint(1,2))
+                       for x
+                       in range(n)]
+    compound = []
+    for x in range(n):
+        city,country,subc = rng.choice(places)
+        if subc in abbrevs and rng.random() < 0.5:
+            compound.append(city + ', ' + abbrevs[subc])
+        else:
+            compound.append(city + ', ' + rng.choice([subc,country]))
+    corpus['compound'] = compound
+    corpus['nickname'] = [rng.choice(nicknames)[0] for x in range(n)]
+    corpus['garbage'] = [''.join(rng.choice(string.ascii_lowercase + ' ')
+                                 for y in range(rng.randint(3,16))).strip()
+                         for x
+                         in range(n)]
+    for category,cases in FIXED_CASES.items():
+        corpus[category] = cases + corpus[category]
+    return corpus
+
+def percentiles(values,points=(50,90,99)):
+    values = sorted(values)
+    if len(values) == 0:
+        return collections.OrderedDict()
+    out = collections.OrderedDict()
+    for p in points:
+        out['p' + str(p)] = values[min(len(values)-1,
+                                       int(len(values)*p/100.0))]
+    out['max'] = values[-1]
+    return out
+
+def measure_import():
+    # a fresh interpreter, so this includes loading the cached index
+    code = ('import time;t=time.perf_counter();import geostring;'
+            'i=time.perf_counter()-t;geostring.resolve("chapel hill");'
+            'print(i,time.perf_counter()-t)')
+    out = subprocess.check_output([sys.executable,'-c',code])
+    import_s,first_s = [float(i) for i in out.split()[-2:]]
+    return collections.OrderedDict({'import_s':import_s,
+                                    'import_and_first_resolve_s':first_s})
+
+def measure_peak(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]/1e6
+    finally:
+        tracemalloc.stop()
+
+def measure_builds(engines,memory=True):
+    builds = collections.OrderedDict()
+    started = time.perf_counter()
+    create_loc_index()
+    builds['create_loc_index_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    load_loc_index()
+    builds['load_loc_index_s'] = time.perf_counter() - started
+    if memory == True:
+        builds['create_loc_index_peak_mb'] = measure_peak(create_loc_index)
+    keys = list(default_loc_index())
+    for engine in engines:
+        started = time.perf_counter()
+        FUZZY_ENGINES[engine](keys)
+        builds[engine + '_build_s'] = time.perf_counter() - started
+        if memory == True:
+            builds[engine + '_peak_mb'] = measure_peak(
+                lambda: FUZZY_ENGINES[engine](keys))
+    return builds
+
+def measure_segments(corpus,engine,max_tolerance=0.25):
+    # uncached per-segment latency of get_geo_info
+    loc_index = Geostring.loc_index
+    out = collections.OrderedDict()
+    for category,strings in corpus.items():
+        latencies = []
+        for i in strings:
+            for s in split_segments(i):
+                started = time.perf_counter()
+                get_geo_info(s,'[^a-z]',loc_index,False,max_tolerance,engine)
+                latencies.append(1000*(time.perf_counter()-started))
+        out[category] = percentiles(latencies)
+    return out
+
+def measure_throughput(corpus,engine,memory=True):
+    out = collections.OrderedDict()
+    for category,strings in corpus.items():
+        started = time.perf_counter()
+        for i in strings:
+            resolve(i,engine=engine)
+        out['resolve_' + category + '_per_s'] = (
+            len(strings)/(time.perf_counter()-started))
+    everything = [i for strings in corpus.values() for i in strings]
+    started = time.perf_counter()
+    for i in everything:
+        Geostring(i,engine=engine)
+    out['geostring_per_s'] = len(everything)/(time.perf_counter()-started)
+    started = time.perf_counter()
+    resolve_many(everything,engine=engine)
+    out['resolve_many_per_s'] = len(everything)/(time.perf_counter()-started)
+    if memory == True:
+        out['resolve_peak_mb'] = measure_peak(
+            lambda: [resolve(i,engine=engine) for i in everything])
+        out['geostring_peak_mb'] = measure_peak(
+            lambda: [Geostring(i,engine=engine) for i in everything])
+    return out
+
+def run(n=200,seed=0,engines=('partition',),memory=True,profile=False):
+    results = collections.OrderedDict()
+    results['startup'] = measure_import()
+    results['builds'] = measure_builds(engines,memory)
+    corpus = build_corpus(n,seed)
+    results['corpus'] = collections.OrderedDict(
+        (i,len(corpus[i])) for i in corpus)
+    maxsize = segment_cache.maxsize
+    try:
+        for engine in engines:
+            # warm the engine and the place store (only built once two
+            # segments match), then measure with the segment cache off
+            resolve('paris, france',engine=engine)
+            segment_cache.resize(0)
+            results[engine + '_segment_ms'] = measure_segments(corpus,engine)
+            results[engine + '_throughput'] = measure_throughput(corpus,
+                                                                 engine,
+                                                                 memory)
+            if profile == True:
+                with profiling.profiled() as p:
+                    for strings in corpus.values():
+                        for i in strings:
+                            resolve(i,engine=engine)
+                results[engine + '_profile'] = p.report()
+    finally:
+        segment_cache.resize(maxsize)
+    try:
+        import resource
+        results['max_rss_mb'] = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0)
+    except ImportError:
+        pass
+    return results
+
+def print_results(results,indent=0):
+    for k,v in results.items():
+        if isinstance(v,dict):
+            print(' '*indent + k)
+            print_results(v,indent+2)
+        elif isinstance(v,float):
+            print(' '*indent + '%-34s %12.4f' % (k,v))
+        else:
+            print(' '*indent + '%-34s %12s' % (k,v))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m geostring.benchmark')
+    parser.add_argument('-n',type=int,default=200,
+                        help='sampled strings per category (default 200)')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--engine',action='append',
+                        choices=sorted(FUZZY_ENGINES),
+                        help='engine to benchmark; repeat for several '
+                             '(default: partition)')
+    parser.add_argument('--no-memory',action='store_true',
+                        help='skip the (slow) tracemalloc peak measurements')
+    parser.add_argument('--profile',action='store_true',
+                        help='add a per-stage profile of resolve')
+    parser.add_argument('--json',help='also write the results to this file')
+    args = parser.parse_args(argv)
+    results = run(args.n,
+                  args.seed,
+                  args.engine or ['partition'],
+                  args.no_memory == False,
+                  args.profile)
+    print_results(results)
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(results,f,indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from .batch import RESOLVED_COLUMNS, resolve_many, resolver_pool
+from .fuzzy import FUZZY_ENGINES
+from .geostring import DEFAULT_DELIMITERS, Geostring
+
+# Streams a CSV, TSV or JSONL file through resolve_many chunk by chunk and
+# writes each input row back out with resolved_* fields appended, in input
+# order. Only one chunk is held in memory at a time.
+
+FORMATS = {'.csv':'csv',
+           '.tsv':'tsv',
+           '.tab':'tsv',
+           '.jsonl':'jsonl',
+           '.ndjson':'jsonl'}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='geostring',
+        description='Resolve a column of location strings in a CSV, TSV '
+                    'or JSONL file.')
+    parser.add_argument('input',
+                        help='input file, or - for stdin')
+    parser.add_argument('-o','--output',default='-',
+                        help='output file, or - for stdout (default)')
+    parser.add_argument('-c','--column',required=True,
+                        help='column name (or 0-based index with '
+                             '--no-header) or JSON key to resolve')
+    parser.add_argument('-f','--format',choices=['csv','tsv','jsonl'],
+                        help='input/output format; guessed from the input '
+                             'file extension by default')
+    parser.add_argument('--no-header',action='store_true',
+                        help='CSV/TSV input has no header row')
+    parser.add_argument('-d','--delimiter',action='append',
+                        dest='delimiters',
+                        help='segment delimiter regex; repeat for several '
+                             '(default: the Geostring delimiters)')
+    parser.add_argument('-t','--max-tolerance',type=float,default=0.25)
+    parser.add_argument('-e','--exact',action='store_true')
+    parser.add_argument('--engine',choices=sorted(FUZZY_ENGINES),
+                        default='partition')
+    parser.add_argument('-w','--workers',type=int,default=1)
+    parser.add_argument('--chunk-size',type=int,default=10000,
+                        help='rows resolved per batch (default 10000)')
+    parser.add_argument('--start-row',type=int,default=0,
+                        help='skip this many data rows, e.g. to resume an '
+                             'interrupted run; output is appended to')
+    parser.add_argument('-q','--quiet',action='store_true',
+                        help='do not report progress on stderr')
+    return parser.parse_args(argv)
+
+def guess_format(path):
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise SystemExit('geostring: cannot guess the format of "' +
+                         path + '"; use --format')
+    return fmt
+
+def read_rows(f,fmt,column,header=True):
+    # yields (row, location string) pairs; the first yielded item is the
+    # header row for CSV/TSV input with a header
+    if fmt == 'jsonl':
+        for line in f:
+            if line.strip() == '':
+                continue
+            row = json.loads(line)
+            value = row.get(column) if isinstance(row,dict) else None
+            yield row,value
+        return
+    reader = csv.reader(f,delimiter='\t' if fmt == 'tsv' else ',')
+    if header == True:
+        header_row = next(reader,None)
+        if header_row is None:
+            return
+        if len(header_row) > 0 and header_row[0].startswith('\ufeff'):
+            # a byte order mark read through stdin
+            header_row[0] = header_row[0][1:]
+        if column not in header_row:
+            raise SystemExit('geostring: column "' + column +
+                             '" not found in header')
+        col = header_row.index(column)
+        yield header_row,None
+    else:
+        try:
+            col = int(column)
+        except ValueError:
+            raise SystemExit('geostring: --column must be an index '
+                             'with --no-header')
+    for row in reader:
+        yield row,row[col] if col < len(row) else None
+
+def write_rows(writer,f,fmt,rows,results):
+    for row,result in zip(rows,results):
+        if result is None:
+            result = dict.fromkeys(RESOLVED_COLUMNS)
+        if fmt == 'jsonl':
+            if isinstance(row,dict):
+                out = dict(row)
+            else:
+                # lines that are not objects are kept under "value"
+                out = {'value':row}
+            out.update(result)
+            f.write(json.dumps(out,ensure_ascii=False) + '\n')
+        else:
+            writer.writerow(row + [result[i] or '' for i in RESOLVED_COLUMNS])
+
+def report(message,quiet):
+    if quiet == False:
+        print(message,file=sys.stderr,flush=True)
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format
+    if fmt is None:
+        if args.input == '-':
+            raise SystemExit('geostring: --format is required with stdin')
+        fmt = guess_format(args.input)
+    delimiters = args.delimiters or DEFAULT_DELIMITERS
+    header = fmt != 'jsonl' and args.no_header == False
+
+    if args.input == '-':
+        fin = sys.stdin
+    else:
+        fin = open(args.input,newline='',encoding='utf-8-sig')
+    if args.output == '-':
+        fout = sys.stdout
+    else:
+        fout = open(args.output,
+                    'a' if args.start_row > 0 else 'w',
+                    newline='',
+                    encoding='utf-8')
+    writer = csv.writer(fout,delimiter='\t' if fmt == 'tsv' else ',')
+    # load (or build) the index before any output is written
+    Geostring.loc_index
+    pool = resolver_pool(args.workers) if args.workers > 1 else None
+
+    stats = {}
+    rows_done = args.start_row
+    started = time.time()
+    try:
+        rows = read_rows(fin,fmt,args.column,header)
+        if header == True:
+            header_row = next(rows,None)
+            if header_row is not None and args.start_row == 0:
+                writer.writerow(header_row[0] + RESOLVED_COLUMNS)
+        rows = itertools.islice(rows,args.start_row,None)
+        while True:
+            chunk = list(itertools.islice(rows,args.chunk_size))
+            if len(chunk) == 0:
+                break
+            chunk_started = time.time()
+            results = resolve_many([i[1] for i in chunk],
+                                   exact=args.exact,
+                                   max_tolerance=args.max_tolerance,
+                                   delimiters=delimiters,
+                                   engine=args.engine,
+                                   workers=args.workers,
+                                   pool=pool,
+                                   stats=stats)
+            write_rows(writer,fout,fmt,[i[0] for i in chunk],results)
+            fout.flush()
+            rows_done += len(chunk)
+            elapsed = time.time() - chunk_started
+            report('geostring: %d rows done (%.0f rows/sec, %.1f%% unique '
+                   'segments); resume with --start-row %d' %
+                   (rows_done,
+                    len(chunk)/elapsed if elapsed > 0 else 0,
+                    100*stats['unique_segments']/max(stats['segments'],1),
+                    rows_done),
+                   args.quiet)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if fin is not sys.stdin:
+            fin.close()
+        if fout is not sys.stdout:
+            fout.close()
+
+    elapsed = time.time() - started
+    n_rows = rows_done - args.start_row
+    report('geostring: resolved %d rows in %.1fs (%.0f rows/sec); '
+           '%d of %d segments unique, %d fuzzy searches' %
+           (n_rows,
+            elapsed,
+            n_rows/elapsed if elapsed > 0 else 0,
+            stats.get('unique_segments',0),
+            stats.get('segments',0),
+            stats.get('fuzzy_searches',0)),
+           args.quiet)
@@ -0,0 +1,151 @@
+import bisect
+import functools
+import re
+from unidecode import unidecode
+from .geostring import Geostring, make_geodict, resolve_results
+from .index_cache import derived_cache
+
+# keys of up to this many characters that do not name their own entry
+# (state and country codes such as "to" or "can") are abbreviations
+ABBREVIATION_LENGTH = 3
+
+# Exact extraction of place mentions from free text. The text is
+# normalized character by character the same way segments are (unidecode,
+# lowercase, re_sub), remembering where each kept character came from and
+# where characters were dropped: those are the token boundaries. The keys
+# of loc_index are kept as a sorted array, which works as a compact trie:
+# from every boundary the scan extends to each following boundary for as
+# long as some key starts with the text covered so far, so every mention
+# is found in one pass bounded by the longest key.
+
+class PlaceMatcher(object):
+    def __init__(self,loc_index):
+        self.keys = sorted(loc_index)
+        self.max_len = max([len(i) for i in self.keys] or [0])
+
+    def find(self,norm,boundaries):
+        # all (start,end,key) with start and end on token boundaries
+        keys = self.keys
+        hits = []
+        for n,start in enumerate(boundaries):
+            for m in range(n+1,len(boundaries)):
+                end = boundaries[m]
+                if end - start > self.max_len:
+                    break
+                cand = norm[start:end]
+                i = bisect.bisect_left(keys,cand)
+                if i == len(keys) or not keys[i].startswith(cand):
+                    break
+                if keys[i] == cand:
+                    hits.append((start,end,cand))
+        return hits
+
+    def apply_changes(self,loc_index,added,removed,changed):
+        # a new list, so searches already running keep the old one
+        keys = list(self.keys)
+        for i in removed:
+            del keys[bisect.bisect_left(keys,i)]
+        for i in added:
+            bisect.insort(keys,i)
+            self.max_len = max(self.max_len,len(i))
+        self.keys = keys
+
+def get_place_matcher(loc_index):
+    return derived_cache.get(loc_index,
+                             'matcher',
+                             lambda: PlaceMatcher(loc_index))
+
+@functools.lru_cache(maxsize=32)
+def kept_chars(re_sub):
+    # re_sub is applied one character at a time; after unidecode every
+    # character is ASCII, so a lookup table covers all of them
+    pattern = re.compile(re_sub)
+    return frozenset(chr(i)
+                     for i
+                     in range(128)
+                     if pattern.sub('',chr(i)) == chr(i))
+
+def normalize_text(text,re_sub='[^a-z]'):
+    keep = kept_chars(re_sub)
+    norm = []
+    offsets = []
+    boundaries = {0}
+    for n,c in enumerate(text):
+        if c >= '\x80':
+            c = unidecode(c)
+        for ch in c.lower():
+            if ch in keep:
+                norm.append(ch)
+                offsets.append(n)
+            else:
+                boundaries.add(len(norm))
+    boundaries.add(len(norm))
+    return ''.join(norm),offsets,sorted(boundaries)
+
+def is_abbreviation(key,loc_index,re_sub='[^a-z]'):
+    if len(key) > ABBREVIATION_LENGTH:
+        return False
+    pattern = re.compile(re_sub)
+    return all(pattern.sub('',i) != key
+               for field
+               in loc_index[key]
+               for i
+               in field.split('?'))
+
+def extract_places(text,
+                   loc_index='',
+                   re_sub='[^a-z]',
+                   min_length=3,
+                   overlapping=False,
+                   abbreviations=False):
+    # Returns one Geostring-style result per exact place mention in text,
+    # in text order, with 'start' and 'end' character offsets into text.
+    # Overlapping mentions are reduced to the leftmost-longest ones unless
+    # overlapping=True. Short keys and abbreviations ("to", "in", "and")
+    # mostly match ordinary words, so keys shorter than min_length are
+    # skipped and abbreviations are only kept with abbreviations=True.
+    if loc_index == '':
+        loc_index = Geostring.loc_index
+    norm,offsets,boundaries = normalize_text(text,re_sub)
+    hits = [i
+            for i
+            in get_place_matcher(loc_index).find(norm,boundaries)
+            if i[1] - i[0] >= min_length
+            and (abbreviations == True
+                 or not is_abbreviation(i[2],loc_index,re_sub))]
+    if overlapping == False:
+        hits.sort(key=lambda i: (i[0],i[0]-i[1]))
+        kept = []
+        for i in hits:
+            if len(kept) == 0 or i[0] >= kept[-1][1]:
+                kept.append(i)
+        hits = kept
+    results = []
+    for start,end,key in hits:
+        start = offsets[start]
+        end = offsets[end-1] + 1
+        geodict = make_geodict(text[start:end],key,(key,0),loc_index)
+        geodict['start'] = start
+        geodict['end'] = end
+        results.append(geodict)
+    return results
+
+def resolve_text(text,
+                 loc_index='',
+                 re_sub='[^a-z]',
+                 min_length=3,
+                 abbreviations=False,
+                 verbose=False):
+    # extracts every place mention in text and resolves them together the
+    # way resolve combines the segments of a location string
+    if loc_index == '':
+        loc_index = Geostring.loc_index
+    return resolve_results(extract_places(text,
+                                          loc_index,
+                                          re_sub,
+                                          min_length,
+                                          abbreviations=abbreviations),
+                           0,
+                           loc_index,
+                           re_sub,
+                           verbose)
@@ -0,0 +1,313 @@
+import bisect
+import collections
+import editdistance as ed
+from functools import partial
+from .index_cache import derived_cache
+
+# Fuzzy lookup engines for get_geo_info. Every engine returns the same best
+# match as a scan over every key in loc_index order: the lowest edit distance
+# wins and ties go to the key that comes first in the index.
+
+class ExhaustiveIndex(object):
+    # reference engine: compares the query against every key
+    def __init__(self,keys):
+        self.keys = list(keys)
+
+    def search(self,query,max_distance=None,stats=None):
+        # stats, if given, is a profiling.Profile counting the keys compared
+        curr_match = (None,None)
+        for i in self.keys:
+            ed_match = ed.eval(query,i)
+            if curr_match[0] is None or ed_match < curr_match[1]:
+                curr_match = (i,ed_match)
+        if stats is not None:
+            stats.count('candidates_examined',len(self.keys))
+        if (curr_match[0] is not None
+            and max_distance is not None
+            and curr_match[1] > max_distance):
+            return (None,None)
+        return curr_match
+
+    def apply_changes(self,loc_index,added,removed,changed):
+        # a new list, so searches already running keep the old one
+        removed = set(removed)
+        self.keys = [i for i in self.keys if i not in removed] + list(added)
+
+class PartitionIndex(object):
+    # Length-bucketed keys plus a pigeonhole filter: if ed(query,key) <= k,
+    # splitting the query into k+1 pieces leaves at least one piece intact
+    # in the key. Pieces are located with str.find over all keys joined into
+    # one string, so only keys sharing a piece are compared. Distances are
+    # tried in increasing order; once the pieces get too short to be
+    # selective the search falls back to scanning the length buckets
+    # closest to the query length.
+    min_piece = 2
+    candidate_ratio = 0.125
+    # ranks of keys removed from the index since the build, and each live
+    # key's rank, which is only needed (and built) once keys are removed
+    removed = frozenset()
+    ranks = None
+
+    def __init__(self,keys):
+        self.keys = list(keys)
+        self.key_set = set(self.keys)
+        self.lengths = [len(i) for i in self.keys]
+        self.starts = []
+        pos = 0
+        for i in self.keys:
+            self.starts.append(pos)
+            pos += len(i) + 1
+        self.blob = '\n'.join(self.keys)
+        self.buckets = collections.defaultdict(lambda: ([],[]))
+        for n,i in enumerate(self.keys):
+            self.buckets[len(i)][0].append(i)
+            self.buckets[len(i)][1].append(n)
+        self.buckets = dict(self.buckets)
+        self.max_len = max(self.buckets) if self.buckets else 0
+        self.max_candidates = max(int(len(self.keys)*self.candidate_ratio),1)
+
+    def search(self,query,max_distance=None,stats=None):
+        match,examined = self.find(query,max_distance)
+        if stats is not None:
+            stats.count('candidates_examined',examined)
+        return match
+
+    def find(self,query,max_distance=None):
+        # returns the match and the number of keys compared
+        if query in self.key_set:
+            return (query,0),0
+        if not self.keys:
+            return (None,None),0
+        if max_distance is None:
+            max_distance = max(len(query),self.max_len)
+        examined = 0
+        k = 1
+        while k <= max_distance:
+            cands = self.candidates(query,k)
+            if cands is None:
+                break
+            best = None
+            for c in cands:
+                if abs(self.lengths[c]-len(query)) <= k:
+                    examined += 1
+                    d = ed.eval(query,self.keys[c])
+                    if d <= k and (best is None or (d,c) < best):
+                        best = (d,c)
+            if best is not None:
+                return (self.keys[best[1]],best[0]),examined
+            k += 1
+        if k > max_distance:
+            return (None,None),examined
+        match,scanned = self.scan(query,max_distance)
+        return match,examined+scanned
+
+    def candidates(self,query,k):
+        piece_len = len(query)//(k+1)
+        if piece_len < self.min_piece:
+            return None
+        cands = set()
+        for p in range(k+1):
+            if p < k:
+                piece = query[p*piece_len:(p+1)*piece_len]
+            else:
+                piece = query[p*piece_len:]
+            i = self.blob.find(piece)
+            while i != -1:
+                cands.add(bisect.bisect_right(self.starts,i)-1)
+                if len(cands) > self.max_candidates:
+                    return None
+                i = self.blob.find(piece,i+1)
+        if len(self.removed) > 0:
+            cands -= self.removed
+        return cands
+
+    def scan(self,query,max_distance):
+        # no key lies within the distances already tried, so scan outward
+        # from the query length until the length gap exceeds the best match
+        best = (None,None,None)
+        buckets = self.buckets
+        examined = 0
+        delta = 0
+        while best[1] is None or delta <= best[1]:
+            if delta > max_distance:
+                break
+            if len(query)-delta < 0 and len(query)+delta > self.max_len:
+                break
+            if delta == 0:
+                lengths = (len(query),)
+            else:
+                lengths = (len(query)-delta,len(query)+delta)
+            for length in lengths:
+                if length not in buckets:
+                    continue
+                bucket_keys,bucket_ranks = buckets[length]
+                examined += len(bucket_keys)
+                dists = list(map(partial(ed.eval,query),bucket_keys))
+                d = min(dists)
+                rank = bucket_ranks[dists.index(d)]
+                if d <= max_distance and (best[1] is None
+                                          or (d,rank) < (best[1],best[2])):
+                    best = (self.keys[rank],d,rank)
+            delta += 1
+        return best[:2],examined
+
+    def apply_changes(self,loc_index,added,removed,changed):
+        # Edits in place of a rebuild. Removed keys stay in the blob and key
+        # list but are dropped from the buckets and from every candidate
+        # set; added keys get the next ranks, matching their position at
+        # the end of the index. Changed entries keep their keys, so they
+        # need nothing. Searches may run during an edit, so the sets and
+        # buckets they read are copied, changed and then swapped in, and
+        # the key lists only ever grow.
+        before = len(self.keys)
+        buckets = dict(self.buckets)
+        key_set = set(self.key_set)
+        def bucket(length):
+            # a fresh copy of the bucket for length, made once per edit
+            if length in buckets and buckets[length] is self.buckets.get(
+                    length):
+                buckets[length] = (list(buckets[length][0]),
+                                   list(buckets[length][1]))
+            return buckets.setdefault(length,([],[]))
+
+        if len(removed) > 0:
+            if self.ranks is None:
+                self.ranks = {i:n
+                              for n,i
+                              in enumerate(self.keys)
+                              if n not in self.removed}
+            removed_ranks = set(self.removed)
+            for i in removed:
+                n = self.ranks.pop(i)
+                removed_ranks.add(n)
+                key_set.discard(i)
+                bucket_keys,bucket_ranks = bucket(len(i))
+                pos = bucket_ranks.index(n)
+                del bucket_keys[pos]
+                del bucket_ranks[pos]
+                if len(bucket_ranks) == 0:
+                    del buckets[len(i)]
+            self.removed = frozenset(removed_ranks)
+        for i in added:
+            n = len(self.keys)
+            if n > 0:
+                self.starts.append(self.starts[-1] + self.lengths[-1] + 1)
+            else:
+                self.starts.append(0)
+            self.lengths.append(len(i))
+            self.keys.append(i)
+            key_set.add(i)
+            bucket_keys,bucket_ranks = bucket(len(i))
+            bucket_keys.append(i)
+            bucket_ranks.append(n)
+            if self.ranks is not None:
+                self.ranks[i] = n
+        if len(added) > 0:
+            self.blob = '\n'.join(([self.blob] if before > 0 else []) +
+                                  list(added))
+        self.buckets = buckets
+        self.key_set = key_set
+        self.max_len = max(buckets) if buckets else 0
+        self.max_candidates = max(int(len(key_set)*self.candidate_ratio),1)
+
+def deletes(word,max_deletes):
+    # every string reachable from word by deleting up to max_deletes chars
+    variants = {word}
+    frontier = {word}
+    for n in range(max_deletes):
+        frontier = {i[:x] + i[x+1:]
+                    for i
+                    in frontier
+                    for x
+                    in range(len(i))}
+        variants.update(frontier)
+    return variants
+
+class SymDeleteIndex(PartitionIndex):
+    # Symmetric-delete (SymSpell-style) candidates: every key is stored
+    # under all of its variants with up to max_distance deletions, and a
+    # query's own deletion variants look those up directly. Any key within
+    # max_distance of the query shares a variant with it, so the best
+    # candidate is the true best match. Memory grows roughly with
+    # len(key)**max_distance per key. If nothing lies within max_distance
+    # but the cutoff allows more, the search falls back to the exhaustive
+    # length-bucketed scan.
+    max_distance = 2
+
+    def __init__(self,keys,max_distance=None):
+        PartitionIndex.__init__(self,keys)
+        if max_distance is not None:
+            self.max_distance = max_distance
+        self.variants = collections.defaultdict(list)
+        for n,i in enumerate(self.keys):
+            for v in deletes(i,self.max_distance):
+                self.variants[v].append(n)
+        self.variants = dict(self.variants)
+
+    def find(self,query,max_distance=None):
+        if query in self.key_set:
+            return (query,0),0
+        if not self.keys:
+            return (None,None),0
+        examined = 0
+        limit = self.max_distance
+        if max_distance is not None:
+            limit = min(limit,max_distance)
+        best = None
+        if limit > 0:
+            cands = set()
+            for v in deletes(query,limit):
+                cands.update(self.variants.get(v,()))
+            if len(self.removed) > 0:
+                cands -= self.removed
+            for c in cands:
+                if abs(self.lengths[c]-len(query)) <= limit:
+                    examined += 1
+                    d = ed.eval(query,self.keys[c])
+                    if d <= limit and (best is None or (d,c) < best):
+                        best = (d,c)
+        if best is not None:
+            return (self.keys[best[1]],best[0]),examined
+        if max_distance is not None and max_distance <= self.max_distance:
+            return (None,None),examined
+        if max_distance is None:
+            max_distance = max(len(query),self.max_len)
+        match,scanned = self.scan(query,max_distance)
+        return match,examined+scanned
+
+    def apply_changes(self,loc_index,added,removed,changed):
+        # removed keys keep their variants and are filtered out by rank
+        start = len(self.keys)
+        PartitionIndex.apply_changes(self,loc_index,added,removed,changed)
+        for n in range(start,len(self.keys)):
+            for v in deletes(self.keys[n],self.max_distance):
+                if v not in self.variants:
+                    self.variants[v] = []
+                self.variants[v].append(n)
+
+FUZZY_ENGINES = {'exhaustive':ExhaustiveIndex,
+                 'partition':PartitionIndex,
+                 'symdelete':SymDeleteIndex}
+
+def get_fuzzy_index(loc_index,engine='partition',rebuild=False):
+    # engines are built once per location index and reused
+    if engine not in FUZZY_ENGINES:
+        raise ValueError('Unknown fuzzy engine "' + str(engine) +
+                         '"; choose from ' + str(sorted(FUZZY_ENGINES)))
+    # shared indexes provide engines that search their mapped arrays
+    build = getattr(loc_index,'shared_engines',{}).get(engine,
+                                                       FUZZY_ENGINES[engine])
+    return derived_cache.get(loc_index,
+                             ('fuzzy',engine),
+                             lambda: build(loc_index),
+                             rebuild)
+
+def max_edit_distance(query_len,max_tolerance=None):
+    # largest edit distance whose tolerance can still be <= max_tolerance:
+    # d/max(len(query),len(key)) <= t and len(key) <= len(query)+d give
+    # d <= t*len(query)/(1-t)
+    if max_tolerance is None or max_tolerance >= 1:
+        return None
+    if max_tolerance < 0:
+        return -1
+    return int(max_tolerance*query_len/(1-max_tolerance) + 1e-9)
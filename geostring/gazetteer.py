@@ -0,0 +1,441 @@
+import csv
+import re
+import threading
+from unidecode import unidecode
+from .index_cache import derived_cache, index_version
+
+# Gazetteer loading and editing. A Gazetteer counts the place rows (city,
+# country, subcountry) and nickname rows (nickname, city, country,
+# subcountry) behind every index key and derives each key's entry from
+# them exactly as create_loc_index does: a city key lists its subcountries
+# and countries (plus those of a subcountry with the same key), country keys
+# override city and subcountry keys, and nickname keys override everything.
+# Rows are streamed from the files one at a time, so memory grows with the
+# number of distinct places rather than the number of rows. Because the rows
+# are kept, single places and nicknames can later be added or removed, and
+# only the keys they touch are recomputed.
+
+def normalize_name(name):
+    if not name.isascii():
+        name = unidecode(name)
+    return name.lower().strip()
+
+def read_rows(path,
+              columns,
+              delimiter=',',
+              skip_header=False,
+              encoding='utf-8-sig',
+              quoting=csv.QUOTE_MINIMAL):
+    # yields the given columns of every non-empty row, normalized like the
+    # bundled files; columns is a tuple of column numbers or a function
+    # that takes the row's list of cells and returns the values
+    with open(path,newline='',encoding=encoding) as f:
+        reader = csv.reader(f,delimiter=delimiter,quoting=quoting)
+        if skip_header == True:
+            next(reader,None)
+        for row in reader:
+            if len(row) == 0:
+                continue
+            if callable(columns):
+                values = columns(row)
+                if values is None:
+                    continue
+            else:
+                values = [row[i] if i < len(row) else '' for i in columns]
+            yield tuple(normalize_name(i) for i in values)
+
+def add_count(counts,item,n=1):
+    # re-inserted at the end, so the most recently added item comes last
+    counts[item] = counts.pop(item,0) + n
+
+def remove_count(counts,item,n=1):
+    if counts[item] <= n:
+        del counts[item]
+    else:
+        counts[item] -= n
+
+def last(counts):
+    return next(reversed(counts))
+
+class Gazetteer(object):
+    def __init__(self,re_sub='[^a-z]'):
+        self.re_sub = re_sub
+        self.pattern = re.compile(re_sub)
+        self.strings = {}
+        # key -> {row:count}; the rows are (city,subcountry,country) for
+        # cities and nicknames and (subcountry,country) for subcountries,
+        # and country keys count country names
+        self.cities = {}
+        self.subcountries = {}
+        self.countries = {}
+        self.nicknames = {}
+
+    def key(self,name):
+        return self.share(self.pattern.sub('',name))
+
+    def share(self,s):
+        return self.strings.setdefault(s,s)
+
+    def add_place(self,city,country,subcountry,n=1):
+        # values must already be normalized (see normalize_name); returns
+        # the keys whose entries may have changed
+        city,country,subcountry = [self.share(i)
+                                   for i
+                                   in (city,country,subcountry)]
+        keys = [self.key(city),self.key(subcountry),self.key(country)]
+        if keys[0] != '':
+            add_count(self.cities.setdefault(keys[0],{}),
+                      (city,subcountry,country),
+                      n)
+        if keys[1] != '':
+            add_count(self.subcountries.setdefault(keys[1],{}),
+                      (subcountry,country),
+                      n)
+        if keys[2] != '':
+            add_count(self.countries.setdefault(keys[2],{}),country,n)
+        return [i for i in keys if i != '']
+
+    def place_rows(self,city,country=None,subcountry=None):
+        # the (city,subcountry,country) rows for city with the given
+        # country and subcountry (None matches any)
+        return [i
+                for i
+                in self.cities.get(self.key(city),{})
+                if i[0] == city
+                and (subcountry is None or i[1] == subcountry)
+                and (country is None or i[2] == country)]
+
+    def remove_place(self,city,country=None,subcountry=None):
+        # removes every row place_rows finds; raises KeyError if there is
+        # none
+        key = self.key(city)
+        rows = self.place_rows(city,country,subcountry)
+        if len(rows) == 0:
+            raise KeyError((city,country,subcountry))
+        keys = [key]
+        for city,subcountry,country in rows:
+            n = self.cities[key][(city,subcountry,country)]
+            remove_count(self.cities[key],(city,subcountry,country),n)
+            subc_key = self.key(subcountry)
+            country_key = self.key(country)
+            if subc_key != '':
+                remove_count(self.subcountries[subc_key],
+                             (subcountry,country),
+                             n)
+                if len(self.subcountries[subc_key]) == 0:
+                    del self.subcountries[subc_key]
+                keys.append(subc_key)
+            if country_key != '':
+                remove_count(self.countries[country_key],country,n)
+                if len(self.countries[country_key]) == 0:
+                    del self.countries[country_key]
+                keys.append(country_key)
+        if len(self.cities[key]) == 0:
+            del self.cities[key]
+        return keys
+
+    def add_nickname(self,nickname,city,country,subcountry,n=1):
+        key = self.key(nickname)
+        add_count(self.nicknames.setdefault(key,{}),
+                  tuple(self.share(i) for i in (city,subcountry,country)),
+                  n)
+        return [key]
+
+    def nickname_rows(self,nickname,city=None,country=None,subcountry=None):
+        return [i
+                for i
+                in self.nicknames.get(self.key(nickname),{})
+                if (city is None or i[0] == city)
+                and (subcountry is None or i[1] == subcountry)
+                and (country is None or i[2] == country)]
+
+    def remove_nickname(self,nickname,city=None,country=None,subcountry=None):
+        key = self.key(nickname)
+        rows = self.nickname_rows(nickname,city,country,subcountry)
+        if len(rows) == 0:
+            raise KeyError((nickname,city,country,subcountry))
+        for i in rows:
+            del self.nicknames[key][i]
+        if len(self.nicknames[key]) == 0:
+            del self.nicknames[key]
+        return [key]
+
+    def check_removals(self,places=(),nicknames=()):
+        # raises the KeyError remove_place or remove_nickname would raise
+        # for the first removal that finds no row once the removals before
+        # it are done, without removing anything
+        taken = set()
+        for row in places:
+            rows = set(self.place_rows(*row)) - taken
+            if len(rows) == 0:
+                raise KeyError(tuple(row))
+            taken.update(rows)
+        for row in nicknames:
+            key = self.key(row[0])
+            rows = {(key,i) for i in self.nickname_rows(*row)} - taken
+            if len(rows) == 0:
+                raise KeyError(tuple(row))
+            taken.update(rows)
+
+    def join(self,names):
+        return self.share('?'.join(sorted(i for i in names if i != '')))
+
+    def entry(self,key,region=None):
+        # the index entry for key, or None if no row produces one; with a
+        # region (a RowFilter) only the rows inside it count
+        nicknames = self.nicknames.get(key)
+        countries = self.countries.get(key)
+        cities = self.cities.get(key)
+        subcountries = self.subcountries.get(key)
+        if region is not None:
+            nicknames = region.select(nicknames,region.place)
+            countries = region.select(countries,region.country)
+            cities = region.select(cities,region.place)
+            subcountries = region.select(subcountries,region.subcountry)
+        if nicknames:
+            return [self.join({i[0] for i in nicknames}),
+                    self.join({i[1] for i in nicknames}),
+                    self.join({i[2] for i in nicknames})]
+        if countries:
+            return ['','',last(countries)]
+        if cities:
+            subc_names = {i[1] for i in cities}
+            country_names = {i[2] for i in cities}
+            if subcountries:
+                subc_names.add(last(subcountries)[0])
+                country_names.update(i[1] for i in subcountries)
+            return [last(cities)[0],
+                    self.join(subc_names),
+                    self.join(country_names)]
+        if subcountries:
+            return ['',
+                    last(subcountries)[0],
+                    self.join({i[1] for i in subcountries})]
+        return None
+
+    def build(self,loc_index=None):
+        # fills loc_index (a new dict by default) with every entry, keys in
+        # create_loc_index's order: cities, then subcountries, countries
+        # and nicknames not seen before
+        if loc_index is None:
+            loc_index = {}
+        for level in [self.cities,
+                      self.subcountries,
+                      self.countries,
+                      self.nicknames]:
+            for key in level:
+                if key not in loc_index:
+                    loc_index[key] = self.entry(key)
+        return loc_index
+
+class RowFilter(object):
+    # The rows inside a region, given as sets of normalized city,
+    # subcountry and country names: the place and nickname rows that
+    # create_loc_index's cities/subcountries/countries filters keep, and
+    # the subcountry and country rows those places produce.
+    def __init__(self,gazetteer,cities=(),subcountries=(),countries=()):
+        self.cities = frozenset(cities)
+        self.subcountries = frozenset(subcountries)
+        self.countries = frozenset(countries)
+        # subcountry and country rows only record names, so the rows of
+        # the region's cities and subcountries are looked up here
+        self.city_pairs = set()
+        self.more_countries = set()
+        for city in self.cities:
+            for row in gazetteer.cities.get(gazetteer.key(city),()):
+                if row[0] == city:
+                    self.city_pairs.add(row[1:])
+                    self.more_countries.add(row[2])
+        for subcountry in self.subcountries:
+            for row in gazetteer.subcountries.get(gazetteer.key(subcountry),
+                                                  ()):
+                if row[0] == subcountry:
+                    self.more_countries.add(row[1])
+
+    def place(self,row):
+        # (city,subcountry,country) rows of cities and nicknames
+        return (row[2] in self.countries
+                or row[1] in self.subcountries
+                or row[0] in self.cities)
+
+    def subcountry(self,row):
+        return (row[1] in self.countries
+                or row[0] in self.subcountries
+                or row in self.city_pairs)
+
+    def country(self,name):
+        return name in self.countries or name in self.more_countries
+
+    def select(self,rows,test):
+        if not rows:
+            return None
+        return {i:n for i,n in rows.items() if test(i)} or None
+
+def stream_rows(add,rows,filters):
+    # Feeds the rows that match any filter to add, one filter at a time as
+    # create_loc_index concatenates them; every filter rereads the file. If
+    # nothing matches (or there are no filters), every row is added.
+    matched = False
+    for column,values in filters:
+        if values is None:
+            continue
+        values = set(values)
+        for row in rows():
+            if row[column] in values:
+                add(*row)
+                matched = True
+    if matched == False:
+        for row in rows():
+            add(*row)
+
+def read_gazetteer(places='',
+                   nicknames='',
+                   re_sub='[^a-z]',
+                   cities=None,
+                   subcountries=None,
+                   countries=None,
+                   place_columns=(0,1,2),
+                   nickname_columns=(0,1,2,3),
+                   delimiter=',',
+                   skip_header=False,
+                   encoding='utf-8-sig'):
+    # the Gazetteer holding the rows of the given files; see load_gazetteer
+    gazetteer = Gazetteer(re_sub)
+    csv_args = {'delimiter':delimiter,
+                'skip_header':skip_header,
+                'encoding':encoding}
+    if places != '':
+        stream_rows(gazetteer.add_place,
+                    lambda: read_rows(places,place_columns,**csv_args),
+                    [(1,countries),(2,subcountries),(0,cities)])
+    if nicknames != '':
+        stream_rows(gazetteer.add_nickname,
+                    lambda: read_rows(nicknames,nickname_columns,**csv_args),
+                    [(2,countries),(3,subcountries),(1,cities)])
+    return gazetteer
+
+def load_gazetteer(places='',
+                   nicknames='',
+                   re_sub='[^a-z]',
+                   cities=None,
+                   subcountries=None,
+                   countries=None,
+                   place_columns=(0,1,2),
+                   nickname_columns=(0,1,2,3),
+                   delimiter=',',
+                   skip_header=False,
+                   encoding='utf-8-sig',
+                   editable=True):
+    # Builds a location index from a places file (city, country,
+    # subcountry) and/or a nicknames file (nickname, city, country,
+    # subcountry) in the bundled files' layout; use the *_columns arguments
+    # for other layouts. cities/subcountries/countries keep only matching
+    # rows, as in create_loc_index. Returns a GazetteerIndex, or a plain dict
+    # if editable=False.
+    gazetteer = read_gazetteer(places,
+                               nicknames,
+                               re_sub,
+                               cities,
+                               subcountries,
+                               countries,
+                               place_columns,
+                               nickname_columns,
+                               delimiter,
+                               skip_header,
+                               encoding)
+    if editable == False:
+        return gazetteer.build()
+    return GazetteerIndex(gazetteer)
+
+class GazetteerIndex(dict):
+    # A location index that can be edited in place with add_place,
+    # remove_place, add_nickname, remove_nickname and edit. Each edit bumps
+    # version and is passed on to the structures built for the index
+    # (fuzzy engines, place stores, extract_places' matcher), which update
+    # themselves instead of being rebuilt; regions are rebuilt on next use.
+    # Editing the dict directly bypasses all of that.
+    def __init__(self,gazetteer=None):
+        dict.__init__(self)
+        if gazetteer is None:
+            gazetteer = Gazetteer()
+        self.gazetteer = gazetteer
+        self.version = 0
+        self.lock = threading.Lock()
+        gazetteer.build(self)
+
+    def add_place(self,city,country='',subcountry=''):
+        return self.edit(add_places=[(city,country,subcountry)])
+
+    def remove_place(self,city,country=None,subcountry=None):
+        return self.edit(remove_places=[(city,country,subcountry)])
+
+    def add_nickname(self,nickname,city='',country='',subcountry=''):
+        return self.edit(add_nicknames=[(nickname,city,country,subcountry)])
+
+    def remove_nickname(self,nickname,city=None,country=None,subcountry=None):
+        return self.edit(remove_nicknames=[(nickname,city,country,subcountry)])
+
+    def edit(self,
+             add_places=(),
+             remove_places=(),
+             add_nicknames=(),
+             remove_nicknames=()):
+        # applies a batch of edits (rows as in the files, None matching
+        # anything in removals) and returns the added, removed and changed
+        # keys; removals come first
+        def normalize(row,fields,removal=False):
+            if isinstance(row,str) or len(row) != fields:
+                raise ValueError('Expected rows of ' + str(fields) +
+                                 ' fields; got ' + repr(row))
+            for i in row:
+                if not isinstance(i,str) and (i is not None
+                                              or removal == False):
+                    raise TypeError('Row fields must be strings' +
+                                    (' or None' if removal == True else '') +
+                                    '; got ' + repr(row))
+            return [normalize_name(i) if i is not None else None for i in row]
+
+        # every row is checked and normalized and every removal checked
+        # before anything changes, so a batch that raises leaves the index
+        # as it was
+        remove_places = [normalize(i,3,True) for i in remove_places]
+        remove_nicknames = [normalize(i,4,True) for i in remove_nicknames]
+        add_places = [normalize(i,3) for i in add_places]
+        add_nicknames = [normalize(i,4) for i in add_nicknames]
+        with self.lock:
+            gazetteer = self.gazetteer
+            gazetteer.check_removals(remove_places,remove_nicknames)
+            touched = []
+            for row in remove_places:
+                touched.extend(gazetteer.remove_place(*row))
+            for row in remove_nicknames:
+                touched.extend(gazetteer.remove_nickname(*row))
+            for row in add_places:
+                touched.extend(gazetteer.add_place(*row))
+            for row in add_nicknames:
+                touched.extend(gazetteer.add_nickname(*row))
+            previous = index_version(self)
+            added = []
+            removed = []
+            changed = []
+            for key in dict.fromkeys(touched):
+                entry = gazetteer.entry(key)
+                if entry is None:
+                    if key in self:
+                        del self[key]
+                        removed.append(key)
+                elif key not in self:
+                    self[key] = entry
+                    added.append(key)
+                elif self[key] != entry:
+                    self[key] = entry
+                    changed.append(key)
+            if len(added) + len(removed) + len(changed) > 0:
+                self.version += 1
+                derived_cache.apply_changes(self,previous,
+                                            added,removed,changed)
+            return added,removed,changed
+
+    def __reduce__(self):
+        # worker processes only read the index, so they get a plain dict
+        return (dict,(dict(self),))
@@ -1,31 +1,88 @@
 import collections
-import editdistance as ed
+import csv
+import functools
 import os
-import pandas as pd
 import re
+import sys
+import threading
 from unidecode import unidecode
+from .fuzzy import get_fuzzy_index, max_edit_distance
+from .gazetteer import load_gazetteer, read_gazetteer
+from .places import EMPTY, get_place_store
+from .regions import get_region
+from .segment_cache import SegmentCache
+from .shared import open_shared_index
+from . import profiling
+from . import storage
 
 filename = __file__
         
-def get_geo_info(geo_input='',
-                 re_sub='',
-                 loc_index=None,
-                 exact=False):
-    geo_input_pp = re.sub(re_sub,
-                          '',
-                          unidecode(geo_input).lower().strip())
+DEFAULT_DELIMITERS = [',',
+                      ';',
+                      '\\|',
+                      '&',
+                      ' and ',
+                      '/',
+                      '\\\\']
+
+# fuzzy matches are memoized here; exact lookups are plain dict lookups
+# and skip it
+segment_cache = SegmentCache()
+
+def preprocess(geo_input,re_sub=''):
+    return re.sub(re_sub,
+                  '',
+                  unidecode(geo_input).lower().strip())
+
+def split_segments(geo_input,delimiters=DEFAULT_DELIMITERS):
+    delimiters = '|'.join(delimiters)
+    geo_input = re.sub(delimiters,',',geo_input)
+    return geo_input.split(',')
+
+def match_segment(geo_input_pp,
+                  loc_index,
+                  exact=False,
+                  max_tolerance=None,
+                  engine='partition',
+                  cache_key=None):
+    # cache_key is passed by callers that already looked the segment up in
+    # segment_cache and missed, so the miss is not counted twice
     curr_match = (None,1000)
+    profiling.count('segments')
     
     if exact == True:
+        profiling.count('exact_lookups')
         if geo_input_pp in loc_index:
             curr_match = (geo_input_pp,0)
         else:
             curr_match = (None,1)
     else:
-        for i in loc_index:
-            ed_match = ed.eval(geo_input_pp,i)
-            if ed_match < curr_match[1]:
-                curr_match = (i,ed_match)
+        max_distance = max_edit_distance(len(geo_input_pp),max_tolerance)
+        if geo_input_pp in loc_index and max_distance != -1:
+            # every engine returns an exact key itself; like resolve_many,
+            # answer it without touching the cache
+            profiling.count('exact_lookups')
+            return (geo_input_pp,0)
+        if cache_key is None:
+            cache_key = segment_cache.key(geo_input_pp,loc_index,max_distance)
+            cached = segment_cache.get(cache_key)
+            if cached is not None:
+                profiling.count('cache_hits')
+                return cached
+        fuzzy_index = get_fuzzy_index(loc_index,engine)
+        profiling.count('fuzzy_searches')
+        started = profiling.start()
+        match = fuzzy_index.search(geo_input_pp,max_distance,profiling.active)
+        profiling.stop('candidate_search',started)
+        if match[0] is not None:
+            curr_match = match
+        elif max_distance is not None and len(loc_index) > 0:
+            # nothing within max_tolerance; the true distance is larger
+            curr_match = (None,max_distance+1)
+        segment_cache.put(cache_key,curr_match)
+    return curr_match
+
+def make_geodict(geo_input,geo_input_pp,curr_match,loc_index):
     if curr_match[0] is not None:
         geodict = collections.OrderedDict(
             {'geo_input':geo_input,
@@ -48,17 +105,52 @@ def get_geo_info(geo_input='',
              'ed_best_match':curr_match[1],
              'ed_tolerance':1})
     return geodict
+
+def get_geo_info(geo_input='',
+                 re_sub='',
+                 loc_index=None,
+                 exact=False,
+                 max_tolerance=None,
+                 engine='partition'):
+    started = profiling.start()
+    geo_input_pp = preprocess(geo_input,re_sub)
+    profiling.stop('normalization',started)
+    curr_match = match_segment(geo_input_pp,
+                               loc_index,
+                               exact,
+                               max_tolerance,
+                               engine)
+    return make_geodict(geo_input,geo_input_pp,curr_match,loc_index)
     
 def resolve(loc_string,
             exact=False,
             max_tolerance=0.25,
-            verbose=False):
-    if exact == True:
-        max_tolerance = 0
-    geostr = Geostring(loc_string,exact=exact)
-    for i in geostr.results:
+            verbose=False,
+            engine='partition',
+            delimiters=DEFAULT_DELIMITERS,
+            loc_index=''):
+    resolver = compiled_resolver(tuple(delimiters),
+                                 exact,
+                                 max_tolerance,
+                                 engine)
+    return resolver.resolve(loc_string,verbose,loc_index)
+
+def resolve_results(results,
+                    max_tolerance=0.25,
+                    loc_index=None,
+                    re_sub='[^a-z]',
+                    verbose=False):
+    # combines the per-segment results of a Geostring into one location
+    for i in results:
         if i['ed_tolerance'] > max_tolerance:
             if verbose == True:
+                if i['geo_input_match'] is None:
+                    print('No match for "' +
+                          i['geo_input'] +
+                          '" within max tolerance of',
+                          max_tolerance,
+                          '; removing...')
+                    continue
                 print('Tolerance between "' + 
                       i['geo_input'] + 
                       '" and "' + 
@@ -68,82 +160,70 @@ def resolve(loc_string,
                       ') equals or exceeds max tolerance of',
                       max_tolerance,
                       '; removing...')
-    geostr.results = [i for i 
-                         in geostr.results 
-                         if i['ed_tolerance'] <= max_tolerance]
+    results = [i for i 
+               in results 
+               if i['ed_tolerance'] <= max_tolerance
+               and i['geo_input_match'] is not None]
                 
-    if geostr.results == []:
+    if results == []:
         if verbose == True:
             print('No results, Geostring object empty...')
         return
-    else:
-        resolved_location = collections.OrderedDict({'resolved_city':'',
-                         'resolved_subcountry':'',
-                         'resolved_country':''})
-        if len(geostr.results) == 1:
-            resolved_location['resolved_city'] = geostr.results[0]['geo_city']
-            resolved_location['resolved_subcountry'] = geostr.results[0]['geo_subcountry']
-            resolved_location['resolved_country'] = geostr.results[0]['geo_country']
-            return resolved_location
-        else:        
-            all_locs = []
-            all_locs.append([i['geo_city'] 
-                             for i 
-                             in geostr.results])
-            all_locs.append([i['geo_subcountry'] 
-                             for i 
-                             in geostr.results])
-            all_locs.append([i['geo_country'] 
-                             for i 
-                             in geostr.results])
-        # vertical resolution: match within corresponding fields
-        for n,i in enumerate(all_locs):
-            loc_list = []
-            for j in i:
-                loc_list.extend(j.split('?'))
-            top_locs = collections.Counter(loc_list).most_common()
-            top_n = top_locs[0][1]
-            resolved_locs = []
-            for j in top_locs:
-                if j[1] == top_n or n == 0:
-                    resolved_locs.append(j[0])
-            resolved_locs = '?'.join(resolved_locs)
-            if n == 0:
-                resolved_location['resolved_city'] = resolved_locs
-            elif n == 1:
-                resolved_location['resolved_subcountry'] = resolved_locs
-            elif n == 2:
-                resolved_location['resolved_country'] = resolved_locs
-        #horizontal resolution: match across fields
-        r_countries = resolved_location['resolved_country'].split('?')
-        r_subcountries = resolved_location['resolved_subcountry'].split('?')
-        
-        r2_subc = []
-        for rc in r_countries:
-            r2_subc.extend([rl 
-                            for rl 
-                            in resolved_location['resolved_subcountry'].split('?') 
-                            if rl != '' 
-                            and rc 
-                            in geostr.loc_index[
-                                         re.sub(
-                                            geostr.re_sub,
-                                            '',
-                                            unidecode(rl).lower().strip())][2]])
-        resolved_location['resolved_subcountry'] = '?'.join(sorted(list(set(r2_subc))))
-        
-        r2_city = []
-        for rc in r_subcountries:
-            r2_city.extend([rl 
-                            for rl 
-                            in resolved_location['resolved_city'].split('?') 
-                            if rl != '' 
-                            and rc in geostr.loc_index[re.sub(geostr.re_sub,
-                           '',
-                           unidecode(rl).lower().strip())][1]])
-        resolved_location['resolved_city'] = '?'.join(sorted(list(set(r2_city))))
-        
-        return resolved_location    
+    return resolve_matches([i['geo_input_match'] for i in results],
+                           loc_index,
+                           re_sub)
+
+def resolve_matches(matches,loc_index=None,re_sub='[^a-z]'):
+    # combines the index keys matched by the kept segments (at least one)
+    resolved_location = collections.OrderedDict({'resolved_city':'',
+                                                 'resolved_subcountry':'',
+                                                 'resolved_country':''})
+    if len(matches) == 1:
+        entry = loc_index[matches[0]]
+        resolved_location['resolved_city'] = entry[0]
+        resolved_location['resolved_subcountry'] = entry[1]
+        resolved_location['resolved_country'] = entry[2]
+        return resolved_location
+
+    store = get_place_store(loc_index,re_sub)
+    started = profiling.start()
+    records = [store.records[i] for i in matches]
+    # vertical resolution: match within corresponding fields; every city
+    # candidate is kept, while subcountries and countries keep only the
+    # most frequent ones (in order of first appearance)
+    r_cities = vertical_resolution([i.cities for i in records],True)
+    r_subcountries = vertical_resolution([i.subcountries for i in records])
+    r_countries = vertical_resolution([i.countries for i in records])
+    profiling.stop('vertical_resolution',started)
+    #horizontal resolution: match across fields
+    started = profiling.start()
+    subc_filter = set(r_subcountries)
+    country_filter = set(r_countries)
+    r2_subc = [i
+               for i
+               in r_subcountries
+               if i != EMPTY
+               and (EMPTY in country_filter
+                    or not store.countries_of[i].isdisjoint(country_filter))]
+    r2_city = [i
+               for i
+               in r_cities
+               if i != EMPTY
+               and (EMPTY in subc_filter
+                    or not store.subcountries_of[i].isdisjoint(subc_filter))]
+    resolved_location['resolved_city'] = '?'.join(
+        sorted(store.names[i] for i in r2_city))
+    resolved_location['resolved_subcountry'] = '?'.join(
+        sorted(store.names[i] for i in r2_subc))
+    resolved_location['resolved_country'] = store.join(r_countries)
+    profiling.stop('horizontal_resolution',started)
+    return resolved_location
+
+def vertical_resolution(fields,keep_all=False):
+    top_locs = collections.Counter(
+        [i for field in fields for i in field]).most_common()
+    top_n = top_locs[0][1]
+    return [i[0] for i in top_locs if i[1] == top_n or keep_all == True]
 
 def get_places(wd,colnum,level,list_out=True):
     if list_out == True:
@@ -162,151 +242,117 @@ def get_places(wd,colnum,level,list_out=True):
                        for c 
                        in level)}
         
+def data_path(fn):
+    return os.path.join(os.path.dirname(os.path.abspath(filename)),fn)
+
+def read_places_csv(path):
+    with open(path,newline='',encoding='utf-8-sig') as f:
+        return [[unidecode(j).lower().strip() for j in i]
+                for i
+                in csv.reader(f)
+                if len(i) > 0]
+
 def create_loc_index(world_data_fn='world_places.csv',
                      world_nick_fn='world_nicknames.csv',
                      re_sub='[^a-z]',
                      cities=None,
                      subcountries=None,
                      countries=None):
-    mod_path = os.path.dirname(os.path.abspath(filename)) + '/'
-    world_data1=pd.read_csv(mod_path + world_data_fn,
-                            keep_default_na=False,
-                            header=None).values.tolist()
-    for n,i in enumerate(world_data1):
-        for x,j in enumerate(i):
-            world_data1[n][x] = unidecode(j).lower().strip()
-            
-    world_data = []
-    
-    if type(countries) is list:
-        world_data.extend(
-                get_places(
-                        world_data1,1,countries))         
-    if type(subcountries) is list:
-        world_data.extend(
-                get_places(
-                        world_data1,2,subcountries))
-    if type(cities) is list:
-        world_data.extend( 
-                get_places(
-                        world_data1,0,cities))
-                           
-    if len(world_data) == 0:
-        world_data = world_data1
-        
-    city_index = {re.sub(re_sub,'',i[0]):['','',''] for i in world_data}
-    subc_index = {re.sub(re_sub,'',i[2]):['','',''] for i in world_data}
-    country_index = {re.sub(re_sub,'',i[1]):['','',''] for i in world_data}
-    
-    for i in world_data:
-        city = re.sub(re_sub,'',i[0])
-        subc = re.sub(re_sub,'',i[2])
-        country = re.sub(re_sub,'',i[1])
-        
-        city_index[city][0] = i[0]
-        city_index[city][1] += "?" + i[2]
-        city_index[city][2] += "?" + i[1]
-        
-        subc_index[subc][0] = ''
-        subc_index[subc][1] = i[2]
-        subc_index[subc][2] += "?" + i[1]
-        
-        country_index[country][0] = ''
-        country_index[country][1] = ''
-        country_index[country][2] = i[1]
-           
-    loc_index = {}
-    loc_index.update(city_index)
-    subc_city_matches = (i for i in subc_index if i in city_index)
-    for i in subc_city_matches:
-        loc_index[i][1] += "?" + subc_index[i][1]
-        loc_index[i][2] += "?" + subc_index[i][2]
-    subc_city_nonmatches = {i:subc_index[i] for i in subc_index if i not in city_index}
-    loc_index.update(subc_city_nonmatches)
-    loc_index.update(country_index)
-    if '' in loc_index:
-        del loc_index['']
-    
-    for i in loc_index:
-        if '?' in loc_index[i][1]:
-            loc_index[i][1] = '?'.join(sorted(list(set(loc_index[i][1].split('?')))))
-        if '?' in loc_index[i][2]:
-            loc_index[i][2] = '?'.join(sorted(list(set(loc_index[i][2].split('?')))))
-        if len(loc_index[i][1]) > 0 and loc_index[i][1][0] == '?':
-            loc_index[i][1] = loc_index[i][1][1:]
-        if len(loc_index[i][2]) > 0 and loc_index[i][2][0] == '?':
-            loc_index[i][2] = loc_index[i][2][1:]
-
-    # add nickname data
+    # both files are streamed row by row; see gazetteer.load_gazetteer for
+    # other file layouts and for indexes that can be edited in place
+    levels = [i if type(i) is list else None
+              for i
+              in [cities,subcountries,countries]]
+    loc_index = load_gazetteer(data_path(world_data_fn),
+                               data_path(world_nick_fn)
+                               if world_nick_fn != ''
+                               else '',
+                               re_sub,
+                               *levels,
+                               editable=False)
+    # stderr, so it never mixes with results written to stdout
+    print('World index created.',file=sys.stderr)
+    return loc_index
+
+def load_loc_index(world_data_fn='world_places.csv',
+                   world_nick_fn='world_nicknames.csv',
+                   re_sub='[^a-z]',
+                   cities=None,
+                   subcountries=None,
+                   countries=None,
+                   cache=True):
+    # same arguments and output as create_loc_index, but the index is read
+    # from a precompiled artifact when one exists for these source files
+    # and arguments, and written out after a fresh build
+    if cache == False:
+        return create_loc_index(world_data_fn,world_nick_fn,re_sub,
+                                cities,subcountries,countries)
+    paths = [data_path(world_data_fn)]
     if world_nick_fn != '':
-        nickname_data1 = pd.read_csv(mod_path + world_nick_fn,
-                                     keep_default_na=False,
-                                     header=None).values.tolist()
-        for n,i in enumerate(nickname_data1):
-            for x,j in enumerate(i):
-                nickname_data1[n][x] = unidecode(j).lower().strip()
-                
-        nickname_data = []
-    
-        if type(countries) is list:
-            nickname_data.extend(
-                    get_places(
-                            nickname_data1,2,countries))         
-        if type(subcountries) is list:
-            nickname_data.extend(
-                    get_places(
-                            nickname_data1,3,subcountries))
-        if type(cities) is list:
-            nickname_data.extend( 
-                    get_places(
-                            nickname_data1,1,cities))
-                               
-        if len(nickname_data) == 0:
-            nickname_data = nickname_data1
-                
-        nickname_index = {re.sub(re_sub,'',i[0]):['','',''] 
-                          for i in nickname_data}
-        for i in nickname_data:
-            nick = re.sub(re_sub,'',i[0])
-            nickname_index[nick][0] += "?" + i[1]
-            nickname_index[nick][1] += "?" + i[3]
-            nickname_index[nick][2] += "?" + i[2]
-            
-        for i in nickname_index:
-            for j in range(3):
-                if '?' in nickname_index[i][j]:
-                    nickname_index[i][j] = '?'.join(sorted(list(set(nickname_index[i][j].split('?')))))
-                if len(nickname_index[i][j]) > 1 and nickname_index[i][j][0] == '?':
-                    nickname_index[i][j] = nickname_index[i][j][1:]
-                    
-    loc_index.update(nickname_index)
-    print('World index created.')
+        paths.append(data_path(world_nick_fn))
+    key = storage.index_key(paths,
+                            re_sub=re_sub,
+                            cities=cities,
+                            subcountries=subcountries,
+                            countries=countries)
+    path = storage.artifact_path('loc_index',key)
+    loc_index = storage.read_artifact(path,key)
+    if loc_index is None:
+        loc_index = create_loc_index(world_data_fn,world_nick_fn,re_sub,
+                                     cities,subcountries,countries)
+        # share repeated candidate strings so each is stored only once
+        shared = {}
+        for i in loc_index:
+            loc_index[i] = [shared.setdefault(j,j) for j in loc_index[i]]
+        storage.write_artifact(path,key,loc_index)
     return loc_index
 
+_default = [None]
+_default_lock = threading.Lock()
+
+def default_loc_index():
+    # the bundled world index, loaded once per process
+    with _default_lock:
+        if _default[0] is None:
+            _default[0] = load_loc_index()
+        return _default[0]
+
+def region(cities=None,
+           subcountries=None,
+           countries=None,
+           loc_index='',
+           re_sub='[^a-z]'):
+    # read-only view of loc_index (the bundled index by default) restricted
+    # to the given cities, subcountries and countries; pass it as
+    # loc_index= to Geostring, resolve, resolve_many or extract_places
+    if loc_index == '':
+        loc_index = default_loc_index()
+    gazetteer = getattr(loc_index,'gazetteer',None)
+    if gazetteer is None:
+        gazetteer = default_gazetteer(re_sub)
+    return get_region(loc_index,cities,subcountries,countries,re_sub,gazetteer)
+
+@functools.lru_cache(maxsize=4)
+def default_gazetteer(re_sub='[^a-z]'):
+    # the rows of the bundled files, which regions of plain (non-editable)
+    # indexes built from them are narrowed with
+    return read_gazetteer(data_path('world_places.csv'),
+                          data_path('world_nicknames.csv'),
+                          re_sub)
+
 def subset_locations(cities=None,
                      subcountries=None,
                      countries=None):
-    base_li = create_loc_index(countries=countries,
-                               subcountries=subcountries,
-                               cities=cities)
-    modified_li = {}
-    if type(countries) is list:
-        modified_li.update(
-            get_places(
-                base_li,2,countries,False))
-    if type(subcountries) is list:
-        modified_li.update(
-            get_places(
-                base_li,1,subcountries,False))
-    if type(cities) is list:
-        modified_li.update(
-            get_places(
-                base_li,0,cities,False))
+    levels = [i if type(i) is list else None
+              for i
+              in [cities,subcountries,countries]]
+    modified_li = region(*levels)
 
     if len(modified_li) == 0:
         print("No locations entered; location index not modified")
     else:
         Geostring.loc_index = modified_li
+        segment_cache.clear()
         mod_places = [i 
                       for i 
                       in [cities,subcountries,countries]
@@ -314,37 +360,185 @@ def subset_locations(cities=None,
         print("Location index modified:",mod_places)
       
 def restore_locations():
-    Geostring.loc_index = create_loc_index()
+    Geostring.loc_index = default_loc_index()
+    segment_cache.clear()
+
+def use_shared_index(path):
+    # switches the default index to the shared index file at path, written
+    # by export_shared_index; restore_locations switches back
+    Geostring.loc_index = open_shared_index(path)
+    segment_cache.clear()
+
+class _DefaultLocIndex(object):
+    # Geostring.loc_index is loaded the first time it is read rather than
+    # when the module is imported; assigning to it works as before
+    lock = threading.Lock()
+
+    def __get__(self,obj,objtype=None):
+        with self.lock:
+            loc_index = Geostring.__dict__['loc_index']
+            if isinstance(loc_index,_DefaultLocIndex):
+                loc_index = default_loc_index()
+                Geostring.loc_index = loc_index
+        return loc_index
         
 class Geostring(object):
-    loc_index = create_loc_index()
+    loc_index = _DefaultLocIndex()
     def __init__(self,
                  geo_input='',
                  re_sub='[^a-z]',
-                 delimiters=[',',
-                             ';',
-                             '\|',
-                             '&',
-                             ' and ',
-                             '/',
-                             '\\\\'],
+                 delimiters=DEFAULT_DELIMITERS,
                  loc_index='',
-                 exact=False):
+                 exact=False,
+                 max_tolerance=None,
+                 engine='partition'):
         self.geo_input = geo_input
         self.re_sub = re_sub
         self.delimiters = delimiters
         self.exact = exact
+        self.max_tolerance = max_tolerance
+        self.engine = engine
         self.results = []
         if loc_index == '':
             self.loc_index = Geostring.loc_index
         else:
             self.loc_index = loc_index
         if geo_input != '':
-            delimiters = '|'.join(delimiters)
-            geo_input = re.sub(delimiters,',',geo_input)
-            for s in geo_input.split(','):
+            started = profiling.start()
+            segments = split_segments(geo_input,delimiters)
+            profiling.stop('splitting',started)
+            for s in segments:
                 self.results.append(
                         get_geo_info(s,
                                      self.re_sub,
                                      self.loc_index,
-                                     self.exact))
+                                     self.exact,
+                                     self.max_tolerance,
+                                     self.engine))
+
+class SegmentMatch(object):
+    # one segment's result as produced by Resolver.match; as_geodict gives
+    # the OrderedDict that Geostring.results holds for it
+    __slots__ = ('segment','segment_pp','match','distance')
+
+    def __init__(self,segment,segment_pp,match,distance):
+        self.segment = segment
+        self.segment_pp = segment_pp
+        self.match = match
+        self.distance = distance
+
+    @property
+    def tolerance(self):
+        if self.match is None:
+            return 1
+        return self.distance/max(len(self.segment_pp),len(self.match))
+
+    def as_geodict(self,loc_index):
+        return make_geodict(self.segment,
+                            self.segment_pp,
+                            (self.match,self.distance),
+                            loc_index)
+
+    def __repr__(self):
+        return 'SegmentMatch(%r, %r, %r, %r)' % (self.segment,
+                                                 self.segment_pp,
+                                                 self.match,
+                                                 self.distance)
+
+class Resolver(object):
+    # Does what resolve does with its options compiled once: the delimiters
+    # and re_sub patterns, and the tolerance cutoff. Already-ASCII segments
+    # skip unidecode, and segments are kept as SegmentMatch records rather
+    # than dicts. A Resolver holds no per-call state, so one instance can be
+    # shared by any number of threads. loc_index='' uses Geostring.loc_index
+    # as it is at call time (so subset_locations and use_shared_index still
+    # apply).
+    def __init__(self,
+                 delimiters=DEFAULT_DELIMITERS,
+                 re_sub='[^a-z]',
+                 max_tolerance=0.25,
+                 exact=False,
+                 loc_index='',
+                 engine='partition'):
+        if exact == True:
+            max_tolerance = 0
+        self.delimiters = list(delimiters)
+        self.re_sub = re_sub
+        self.max_tolerance = max_tolerance
+        self.exact = exact
+        self.loc_index = loc_index
+        self.engine = engine
+        self.delimiter_pattern = re.compile('|'.join(self.delimiters))
+        self.sub_pattern = re.compile(re_sub)
+
+    def get_loc_index(self,loc_index=''):
+        if loc_index == '':
+            loc_index = self.loc_index
+        if loc_index == '':
+            loc_index = Geostring.loc_index
+        return loc_index
+
+    def split(self,loc_string):
+        return self.delimiter_pattern.sub(',',loc_string).split(',')
+
+    def preprocess(self,segment):
+        if not segment.isascii():
+            segment = unidecode(segment)
+        return self.sub_pattern.sub('',segment.lower().strip())
+
+    def match(self,loc_string,loc_index=''):
+        # the SegmentMatch of every segment of loc_string, in order
+        loc_index = self.get_loc_index(loc_index)
+        if loc_string == '':
+            return []
+        started = profiling.start()
+        segments = self.split(loc_string)
+        profiling.stop('splitting',started)
+        matches = []
+        for s in segments:
+            started = profiling.start()
+            segment_pp = self.preprocess(s)
+            profiling.stop('normalization',started)
+            match,distance = match_segment(segment_pp,
+                                           loc_index,
+                                           self.exact,
+                                           self.max_tolerance,
+                                           self.engine)
+            matches.append(SegmentMatch(s,segment_pp,match,distance))
+        return matches
+
+    def resolve(self,loc_string,verbose=False,loc_index=''):
+        started = profiling.start()
+        loc_index = self.get_loc_index(loc_index)
+        matches = self.match(loc_string,loc_index)
+        if verbose == True:
+            resolved_location = resolve_results(
+                [i.as_geodict(loc_index) for i in matches],
+                self.max_tolerance,
+                loc_index,
+                self.re_sub,
+                True)
+        else:
+            kept = [i.match
+                    for i
+                    in matches
+                    if i.match is not None
+                    and i.tolerance <= self.max_tolerance]
+            resolved_location = None
+            if kept != []:
+                resolved_location = resolve_matches(kept,
+                                                    loc_index,
+                                                    self.re_sub)
+        profiling.stop('resolve',started)
+        return resolved_location
+
+@functools.lru_cache(maxsize=64)
+def compiled_resolver(delimiters=tuple(DEFAULT_DELIMITERS),
+                      exact=False,
+                      max_tolerance=0.25,
+                      engine='partition'):
+    # the shared Resolver behind resolve for each set of options
+    return Resolver(delimiters,
+                    exact=exact,
+                    max_tolerance=max_tolerance,
+                    engine=engine)
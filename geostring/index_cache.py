@@ -0,0 +1,62 @@
+import collections
+import threading
+
+# Structures derived from a location index (fuzzy engines, place stores)
+# are built on first use and kept for the most recently used indexes. A
+# structure is rebuilt when its index has changed size (or, for indexes
+# edited in place, version) since it was built.
+
+def index_version(loc_index):
+    return (len(loc_index),getattr(loc_index,'version',None))
+
+class DerivedCache(object):
+    def __init__(self,maxsize=64):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+
+    def get(self,loc_index,name,build,rebuild=False):
+        cache_key = (id(loc_index),name)
+        with self.lock:
+            cached = self.entries.get(cache_key)
+            if (rebuild == False
+                and cached is not None
+                and cached[0] is loc_index
+                and cached[1] == index_version(loc_index)):
+                self.entries.move_to_end(cache_key)
+                return cached[2]
+        # built outside the lock; two threads may both build, which only
+        # wastes work
+        derived = build()
+        with self.lock:
+            self.entries[cache_key] = (loc_index,
+                                       index_version(loc_index),
+                                       derived)
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return derived
+
+    def apply_changes(self,loc_index,previous,added,removed,changed):
+        # called after loc_index was edited in place (previous is its
+        # version before the edit): structures with an apply_changes method
+        # are updated, the rest are dropped and rebuilt on next use
+        with self.lock:
+            for cache_key in list(self.entries):
+                cached = self.entries[cache_key]
+                if cached[0] is not loc_index:
+                    continue
+                apply = getattr(cached[2],'apply_changes',None)
+                if apply is None or cached[1] != previous:
+                    del self.entries[cache_key]
+                    continue
+                apply(loc_index,added,removed,changed)
+                self.entries[cache_key] = (loc_index,
+                                           index_version(loc_index),
+                                           cached[2])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+derived_cache = DerivedCache()
@@ -0,0 +1,94 @@
+import re
+from unidecode import unidecode
+from .index_cache import derived_cache
+
+# Integer-ID view of a location index used by resolve. Every place name is
+# interned once, each key's three "?"-joined fields become tuples of name
+# ids, and the relations horizontal resolution needs (which subcountries
+# and countries a name's own index entry lists) are precomputed as
+# frozensets of ids. Resolution then works on ids and set intersections and
+# only turns ids back into strings for its output.
+
+EMPTY = 0
+
+class PlaceRecord(object):
+    __slots__ = ('cities','subcountries','countries')
+
+    def __init__(self,cities,subcountries,countries):
+        self.cities = cities
+        self.subcountries = subcountries
+        self.countries = countries
+
+class PlaceStore(object):
+    def __init__(self,loc_index,re_sub='[^a-z]'):
+        self.re_sub = re_sub
+        self.names = ['']
+        self.name_ids = {'':EMPTY}
+        self.records = {}
+        for key in loc_index:
+            self.records[key] = self.record(loc_index[key])
+        # a name's relations come from the index entry its normalized form
+        # points to; names without an entry have no relations
+        self.subcountries_of = []
+        self.countries_of = []
+        self.names_by_key = {}
+        self.relate(range(len(self.names)))
+
+    def record(self,fields):
+        return PlaceRecord(self.intern(fields[0]),
+                           self.intern(fields[1]),
+                           self.intern(fields[2]))
+
+    def relate(self,ids):
+        # (re)computes the relations of name ids given in increasing order;
+        # new names are also filed under their normalized key
+        no_record = PlaceRecord((),(),())
+        for n in ids:
+            key = re.sub(self.re_sub,
+                         '',
+                         unidecode(self.names[n]).lower().strip())
+            if n == len(self.countries_of):
+                self.subcountries_of.append(frozenset())
+                self.countries_of.append(frozenset())
+                if n != EMPTY:
+                    self.names_by_key.setdefault(key,[]).append(n)
+            if n == EMPTY:
+                continue
+            record = self.records.get(key,no_record)
+            self.subcountries_of[n] = frozenset(record.subcountries)
+            self.countries_of[n] = frozenset(record.countries)
+
+    def intern(self,field):
+        ids = []
+        for name in field.split('?'):
+            if name not in self.name_ids:
+                self.name_ids[name] = len(self.names)
+                self.names.append(name)
+            ids.append(self.name_ids[name])
+        return tuple(ids)
+
+    def join(self,ids):
+        return '?'.join([self.names[i] for i in ids])
+
+    def apply_changes(self,loc_index,added,removed,changed):
+        # re-reads the edited entries; names are only ever added, and the
+        # relations of every name whose key was edited are refreshed
+        first_new = len(self.names)
+        for key in removed:
+            del self.records[key]
+        for key in list(added) + list(changed):
+            self.records[key] = self.record(loc_index[key])
+        refresh = set(range(first_new,len(self.names)))
+        for key in list(added) + list(removed) + list(changed):
+            refresh.update(self.names_by_key.get(key,()))
+        self.relate(sorted(refresh))
+
+def get_place_store(loc_index,re_sub='[^a-z]'):
+    # a shared index carries a store built with the re_sub it was exported
+    # with
+    store = getattr(loc_index,'place_store',None)
+    if store is not None and store.re_sub == re_sub:
+        return store
+    return derived_cache.get(loc_index,
+                             ('places',re_sub),
+                             lambda: PlaceStore(loc_index,re_sub))
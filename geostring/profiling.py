@@ -0,0 +1,92 @@
+import collections
+import threading
+import time
+
+# Optional per-stage timing for get_geo_info and resolve. While a Profile
+# is active, the pipeline records how long it spends in each stage and
+# counts segments, lookups and the candidates the fuzzy engines compare;
+# when none is active each hook is a single check.
+
+active = None
+
+class Profile(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = collections.OrderedDict()
+        self.counters = collections.OrderedDict()
+
+    def add(self,stage,seconds):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = [0,0.0]
+            self.stages[stage][0] += 1
+            self.stages[stage][1] += seconds
+
+    def count(self,name,n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name,0) + n
+
+    def report(self):
+        with self.lock:
+            report = collections.OrderedDict()
+            for stage,(calls,seconds) in self.stages.items():
+                report[stage] = collections.OrderedDict(
+                    {'calls':calls,
+                     'seconds':seconds,
+                     'mean_ms':1000*seconds/calls})
+            report['counters'] = collections.OrderedDict(self.counters)
+            searches = self.counters.get('fuzzy_searches',0)
+            if searches > 0:
+                report['counters']['candidates_per_search'] = (
+                    self.counters.get('candidates_examined',0)/searches)
+            return report
+
+    def __str__(self):
+        report = self.report()
+        lines = ['%-24s %10s %12s %12s' % ('stage','calls','total_s',
+                                           'mean_ms')]
+        for stage,row in report.items():
+            if stage == 'counters':
+                continue
+            lines.append('%-24s %10d %12.4f %12.4f' % (stage,
+                                                       row['calls'],
+                                                       row['seconds'],
+                                                       row['mean_ms']))
+        for name,value in report['counters'].items():
+            lines.append('%-24s %10s' % (name,
+                                         '%.1f' % value
+                                         if isinstance(value,float)
+                                         else value))
+        return '\n'.join(lines)
+
+def enable():
+    global active
+    active = Profile()
+    return active
+
+def disable():
+    global active
+    profile = active
+    active = None
+    return profile
+
+class profiled(object):
+    # with profiled() as p: ... then print(p)
+    def __enter__(self):
+        self.previous = active
+        return enable()
+
+    def __exit__(self,*exc):
+        global active
+        active = self.previous
+
+def start():
+    return time.perf_counter() if active is not None else None
+
+def stop(stage,started):
+    if started is not None and active is not None:
+        active.add(stage,time.perf_counter()-started)
+
+def count(name,n=1):
+    if active is not None:
+        active.count(name,n)
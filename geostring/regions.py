@@ -0,0 +1,160 @@
+import collections
+import collections.abc
+from .gazetteer import RowFilter, normalize_name
+from .index_cache import derived_cache
+
+# Regional views of a location index. Every key of a base index is
+# partitioned once by the city, subcountry and country names of the rows it
+# was built from (see gazetteer.Gazetteer); a RegionView is the union of
+# some of those partitions, so creating one costs a few set unions and never
+# touches the CSVs. Views are read-only Mappings that can be passed as
+# loc_index= anywhere a dict can. Their entries are rebuilt from only the
+# rows inside the region, so they list exactly what create_loc_index would
+# for the same filters: "oxford" in a United Kingdom view lists only england
+# and united kingdom, and "georgia" in a Georgia view is not the US state.
+# Fuzzy engines and place stores are built per view on first use, so
+# searches only ever look at the region's keys.
+
+class RegionPartitions(object):
+    def __init__(self,loc_index,gazetteer):
+        if gazetteer is not getattr(loc_index,'gazetteer',None):
+            # rows borrowed from elsewhere (the bundled files) must be the
+            # ones the index was built from
+            for key in loc_index:
+                if gazetteer.entry(key) != list(loc_index[key]):
+                    raise ValueError('regions need the rows the location '
+                                     'index was built from; build it with '
+                                     'load_gazetteer')
+        self.gazetteer = gazetteer
+        self.keys = list(loc_index)
+        self.ranks = {i:n for n,i in enumerate(self.keys)}
+        self.by_city = collections.defaultdict(set)
+        self.by_subcountry = collections.defaultdict(set)
+        self.by_country = collections.defaultdict(set)
+        # a row counts towards the partitions of each of its names, for
+        # every key whose entry it contributes to
+        for rows in [gazetteer.cities,gazetteer.nicknames]:
+            for key in rows:
+                for city,subcountry,country in rows[key]:
+                    self.add(key,city,subcountry,country)
+                    if rows is gazetteer.cities:
+                        self.add(gazetteer.key(subcountry),
+                                 city,subcountry,country)
+                        self.add(gazetteer.key(country),
+                                 city,subcountry,country)
+        for key in gazetteer.subcountries:
+            for subcountry,country in gazetteer.subcountries[key]:
+                self.add(key,'',subcountry,country)
+                self.add(gazetteer.key(country),'',subcountry,country)
+        for key in gazetteer.countries:
+            for country in gazetteer.countries[key]:
+                self.add(key,'','',country)
+        self.by_city = {i:frozenset(self.by_city[i]) for i in self.by_city}
+        self.by_subcountry = {i:frozenset(self.by_subcountry[i])
+                              for i
+                              in self.by_subcountry}
+        self.by_country = {i:frozenset(self.by_country[i])
+                           for i
+                           in self.by_country}
+
+    def add(self,key,city,subcountry,country):
+        n = self.ranks.get(key)
+        if n is None:
+            return
+        for name,partition in [(city,self.by_city),
+                               (subcountry,self.by_subcountry),
+                               (country,self.by_country)]:
+            if name != '':
+                partition[name].add(n)
+
+    def names(self,names,partition):
+        # the given names that occur at this level, normalized
+        return frozenset(i
+                         for i
+                         in (normalize_name(j) for j in names or [])
+                         if i in partition)
+
+def get_region_partitions(loc_index,re_sub='[^a-z]',gazetteer=None):
+    if gazetteer is None:
+        gazetteer = loc_index.gazetteer
+    return derived_cache.get(loc_index,
+                             ('regions',re_sub),
+                             lambda: RegionPartitions(loc_index,gazetteer))
+
+class RegionView(collections.abc.Mapping):
+    def __init__(self,partitions,cities=(),subcountries=(),countries=()):
+        self._partitions = partitions
+        self._cities = cities
+        self._subcountries = subcountries
+        self._countries = countries
+        self._region = RowFilter(partitions.gazetteer,
+                                 cities,
+                                 subcountries,
+                                 countries)
+        ranks = set()
+        for names,partition in [(cities,partitions.by_city),
+                                (subcountries,partitions.by_subcountry),
+                                (countries,partitions.by_country)]:
+            for i in names:
+                ranks.update(partition.get(i,()))
+        self._ranks = frozenset(ranks)
+        self._keys = None
+        self._entries = {}
+
+    def __getitem__(self,key):
+        rank = self._partitions.ranks.get(key)
+        if rank is None or rank not in self._ranks:
+            raise KeyError(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._partitions.gazetteer.entry(key,self._region)
+            if entry is None:
+                # the rows changed since the view was taken
+                raise KeyError(key)
+            entry = tuple(entry)
+            self._entries[key] = entry
+        return list(entry)
+
+    def __contains__(self,key):
+        rank = self._partitions.ranks.get(key)
+        return rank is not None and rank in self._ranks
+
+    def __iter__(self):
+        # base index order, which fuzzy matching uses to break ties
+        if self._keys is None:
+            self._keys = tuple(self._partitions.keys[i]
+                               for i
+                               in sorted(self._ranks))
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._ranks)
+
+    def __eq__(self,other):
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return ('RegionView(cities=%r, subcountries=%r, countries=%r, '
+                'keys=%d)' % (sorted(self._cities),
+                              sorted(self._subcountries),
+                              sorted(self._countries),
+                              len(self)))
+
+def get_region(loc_index,
+               cities=None,
+               subcountries=None,
+               countries=None,
+               re_sub='[^a-z]',
+               gazetteer=None):
+    # the same region of the same index always returns the same view, so
+    # the structures built for it are reused; gazetteer holds the rows the
+    # index was built from and defaults to loc_index.gazetteer
+    partitions = get_region_partitions(loc_index,re_sub,gazetteer)
+    names = (partitions.names(cities,partitions.by_city),
+             partitions.names(subcountries,partitions.by_subcountry),
+             partitions.names(countries,partitions.by_country))
+    return derived_cache.get(loc_index,
+                             ('region',re_sub) + names,
+                             lambda: RegionView(partitions,*names))
@@ -0,0 +1,100 @@
+import collections
+import itertools
+import threading
+from .index_cache import index_version
+
+# Bounded LRU memo of fuzzy segment matches shared by Geostring, resolve and
+# resolve_many. Entries are keyed on the preprocessed segment, the edit
+# distance cutoff and a token identifying the location index; an index gets
+# a new token whenever a different object (or the same one with a different
+# size or version) is searched, so swapping or editing Geostring.loc_index
+# never serves a match from the old index.
+
+class SegmentCache(object):
+    def __init__(self,maxsize=50000,max_indexes=8):
+        self.maxsize = maxsize
+        self.max_indexes = max_indexes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.index_tokens = collections.OrderedDict()
+        self.token_counter = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def index_token(self,loc_index):
+        with self.lock:
+            cached = self.index_tokens.get(id(loc_index))
+            if (cached is not None
+                and cached[0] is loc_index
+                and cached[1] == index_version(loc_index)):
+                self.index_tokens.move_to_end(id(loc_index))
+                return cached[2]
+            token = next(self.token_counter)
+            self.index_tokens[id(loc_index)] = (loc_index,
+                                                index_version(loc_index),
+                                                token)
+            while len(self.index_tokens) > self.max_indexes:
+                self.index_tokens.popitem(last=False)
+            return token
+
+    def key(self,geo_input_pp,loc_index,max_distance=None):
+        return (geo_input_pp,max_distance,self.index_token(loc_index))
+
+    def get(self,key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self,key,value):
+        with self.lock:
+            if self.maxsize <= 0:
+                return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def resize(self,maxsize):
+        with self.lock:
+            self.maxsize = maxsize
+            while len(self.entries) > max(maxsize,0):
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.index_tokens.clear()
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @property
+    def size(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits/lookups if lookups > 0 else 0.0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return collections.OrderedDict(
+                {'hits':self.hits,
+                 'misses':self.misses,
+                 'hit_rate':self.hits/lookups if lookups > 0 else 0.0,
+                 'size':len(self.entries),
+                 'maxsize':self.maxsize,
+                 'evictions':self.evictions})
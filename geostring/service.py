@@ -0,0 +1,428 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import sys
+import time
+import urllib.parse
+from . import batch
+from .batch import resolve_many
+from .fuzzy import FUZZY_ENGINES
+from .geostring import DEFAULT_DELIMITERS, Geostring, use_shared_index
+
+# Asynchronous resolution for asyncio programs, and a small local server
+# built on it. Concurrent resolve calls are queued and taken off the queue
+# in micro-batches: a batch is sent as soon as it is full or max_delay
+# seconds after its first request arrived, whichever comes first. Each batch
+# is one resolve_many call, so repeated inputs and segments are matched once
+# per batch, and it runs on a thread or process executor so the event loop
+# never waits on matching. Up to one batch per executor worker is in flight.
+
+class AsyncResolver(object):
+    def __init__(self,
+                 exact=False,
+                 max_tolerance=0.25,
+                 delimiters=DEFAULT_DELIMITERS,
+                 re_sub='[^a-z]',
+                 loc_index='',
+                 engine='partition',
+                 max_batch=256,
+                 max_delay=0.005,
+                 workers=1,
+                 processes=False,
+                 executor=None):
+        # processes=True runs batches in a pool of worker processes that
+        # receive loc_index once (a SharedIndex is reopened, not copied);
+        # otherwise they run on a thread pool, or on executor if one is
+        # given, which close then leaves running
+        if loc_index == '':
+            loc_index = Geostring.loc_index
+        self.loc_index = loc_index
+        self.options = {'exact':exact,
+                        'max_tolerance':max_tolerance,
+                        'delimiters':delimiters,
+                        're_sub':re_sub,
+                        'engine':engine}
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.workers = workers
+        self.processes = processes
+        if executor is not None and processes == True:
+            raise ValueError('executor is for threads; leave it out to '
+                             'run batches in processes')
+        self.own_executor = executor is None
+        self.executor = executor
+        self.pending = collections.deque()
+        self.batcher = None
+        self.closed = False
+        self.in_flight = 0
+        self.counters = collections.OrderedDict(
+            [(i,0) for i in ['requests','batches','max_batch_size',
+                             'last_batch_size','inputs','unique_inputs',
+                             'segments','unique_segments','fuzzy_searches',
+                             'errors']])
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.batch_seconds = 0.0
+
+    def warm_up(self):
+        # builds the engine and the place store now rather than on the first
+        # requests; in processes mode the pool is started and every worker
+        # builds its own
+        if self.processes == False:
+            batch._warm_up(self.loc_index,self.options)
+        elif self.executor is None:
+            self.executor = self.process_pool()
+            concurrent.futures.wait([self.executor.submit(int)
+                                     for n
+                                     in range(self.workers)])
+
+    def process_pool(self):
+        return concurrent.futures.ProcessPoolExecutor(
+            self.workers,
+            initializer=batch._init_worker,
+            initargs=(self.loc_index,self.options))
+
+    def start(self):
+        # called from the event loop on first use
+        if self.batcher is not None:
+            return
+        if self.executor is None:
+            if self.processes == True:
+                self.executor = self.process_pool()
+            else:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    self.workers,
+                    thread_name_prefix='geostring')
+        self.wakeup = asyncio.Event()
+        self.full = asyncio.Event()
+        self.slots = asyncio.Semaphore(max(self.workers,1))
+        self.batcher = asyncio.get_running_loop().create_task(self.run())
+
+    async def resolve(self,loc_string):
+        # what resolve(loc_string) returns, with this resolver's options
+        if self.closed == True:
+            raise RuntimeError('AsyncResolver is closed')
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((loc_string,future,time.perf_counter()))
+        self.counters['requests'] += 1
+        self.wakeup.set()
+        if len(self.pending) >= self.max_batch:
+            self.full.set()
+        return await future
+
+    async def resolve_many(self,loc_strings):
+        return await asyncio.gather(*[self.resolve(i) for i in loc_strings])
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        while True:
+            await self.wakeup.wait()
+            if len(self.pending) == 0:
+                if self.closed == True:
+                    break
+                self.wakeup.clear()
+                continue
+            if len(self.pending) < self.max_batch and self.closed == False:
+                # give the batch until max_delay after its first request
+                # to fill up
+                self.full.clear()
+                delay = (self.pending[0][2] + self.max_delay
+                         - time.perf_counter())
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self.full.wait(),delay)
+                    except asyncio.TimeoutError:
+                        pass
+            items = []
+            while len(self.pending) > 0 and len(items) < self.max_batch:
+                items.append(self.pending.popleft())
+            items = [i for i in items if not i[1].done()]
+            if len(items) == 0:
+                continue
+            await self.slots.acquire()
+            task = loop.create_task(self.process(items))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if len(tasks) > 0:
+            await asyncio.wait(tasks)
+
+    async def process(self,items):
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loc_strings = [i[0] for i in items]
+            if self.processes == True:
+                results,stats = await loop.run_in_executor(
+                    self.executor,
+                    batch._resolve_chunk,
+                    (loc_strings,self.options))
+            else:
+                stats = {}
+                results = await loop.run_in_executor(
+                    self.executor,
+                    lambda: resolve_many(loc_strings,
+                                         loc_index=self.loc_index,
+                                         stats=stats,
+                                         **self.options))
+        except Exception as e:
+            self.counters['errors'] += 1
+            for i in items:
+                if not i[1].done():
+                    i[1].set_exception(e)
+            return
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+        finished = time.perf_counter()
+        self.batch_seconds += finished - started
+        self.counters['batches'] += 1
+        self.counters['last_batch_size'] = len(items)
+        self.counters['max_batch_size'] = max(self.counters['max_batch_size'],
+                                              len(items))
+        for k,v in stats.items():
+            self.counters[k] = self.counters.get(k,0) + v
+        for (loc_string,future,queued),result in zip(items,results):
+            self.latency_total += finished - queued
+            self.latency_max = max(self.latency_max,finished - queued)
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self):
+        metrics = collections.OrderedDict()
+        metrics['queue_depth'] = len(self.pending)
+        metrics['in_flight_batches'] = self.in_flight
+        metrics.update(self.counters)
+        batches = self.counters['batches']
+        resolved = self.counters['inputs']
+        metrics['mean_batch_size'] = resolved/batches if batches > 0 else 0.0
+        metrics['mean_batch_ms'] = (1000*self.batch_seconds/batches
+                                    if batches > 0
+                                    else 0.0)
+        metrics['mean_latency_ms'] = (1000*self.latency_total/resolved
+                                      if resolved > 0
+                                      else 0.0)
+        metrics['max_latency_ms'] = 1000*self.latency_max
+        return metrics
+
+    async def close(self):
+        # resolves everything already queued, then stops
+        self.closed = True
+        if self.batcher is not None:
+            self.wakeup.set()
+            self.full.set()
+            await self.batcher
+        if self.own_executor == True and self.executor is not None:
+            self.executor.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc):
+        await self.close()
+
+# local server
+
+def json_bytes(obj):
+    return (json.dumps(obj,ensure_ascii=False) + '\n').encode('utf-8')
+
+async def handle_request(resolver,method,target,body):
+    # returns (status,payload) for one HTTP request
+    url = urllib.parse.urlsplit(target)
+    if url.path == '/health':
+        return 200,{'status':'ok'}
+    if url.path == '/metrics':
+        return 200,resolver.metrics()
+    if url.path != '/resolve':
+        return 404,{'error':'not found'}
+    if method == 'GET':
+        query = urllib.parse.parse_qs(url.query).get('q')
+        if query is None:
+            return 400,{'error':'missing q parameter'}
+        if len(query) == 1:
+            return 200,await resolver.resolve(query[0])
+        return 200,await resolver.resolve_many(query)
+    if method == 'POST':
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            return 400,{'error':'body is not JSON'}
+        if isinstance(payload,dict):
+            payload = payload.get('q')
+        if isinstance(payload,list):
+            return 200,await resolver.resolve_many(payload)
+        if isinstance(payload,str):
+            return 200,await resolver.resolve(payload)
+        return 400,{'error':'expected a string, a list or {"q": ...}'}
+    return 405,{'error':'use GET or POST'}
+
+REASONS = {200:'OK',400:'Bad Request',404:'Not Found',
+           405:'Method Not Allowed',500:'Internal Server Error'}
+
+async def serve_connection(resolver,reader,writer):
+    # minimal HTTP/1.1 with keep-alive
+    try:
+        while True:
+            request_line = await reader.readline()
+            if request_line == b'':
+                break
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n',b'\n',b''):
+                    break
+                name,_,value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = b''
+            length = int(headers.get('content-length',0) or 0)
+            if length > 0:
+                body = await reader.readexactly(length)
+            try:
+                status,payload = await handle_request(resolver,
+                                                      parts[0].upper(),
+                                                      parts[1],
+                                                      body)
+            except Exception as e:
+                status,payload = 500,{'error':str(e)}
+            data = json_bytes(payload)
+            keep_alive = (headers.get('connection','').lower() != 'close'
+                          and parts[-1] != 'HTTP/1.0')
+            writer.write(('HTTP/1.1 %d %s\r\n'
+                          'Content-Type: application/json\r\n'
+                          'Content-Length: %d\r\n'
+                          'Connection: %s\r\n\r\n' %
+                          (status,
+                           REASONS[status],
+                           len(data),
+                           'keep-alive' if keep_alive else 'close'))
+                         .encode('latin-1') + data)
+            await writer.drain()
+            if keep_alive == False:
+                break
+    except (ConnectionError,asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve_http(resolver,host='127.0.0.1',port=8765):
+    server = await asyncio.start_server(
+        lambda r,w: serve_connection(resolver,r,w),host,port)
+    async with server:
+        await server.serve_forever()
+
+async def serve_stdio(resolver,max_pending=10000,fin=None,fout=None):
+    # One request per input line: either a JSON object with a "q" key
+    # (and an optional "id", echoed back) or a plain location string.
+    # Results are written as JSON lines in input order.
+    fin = fin or sys.stdin
+    fout = fout or sys.stdout
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue(max_pending)
+
+    async def read():
+        while True:
+            line = await loop.run_in_executor(None,fin.readline)
+            if line == '':
+                break
+            line = line.rstrip('\r\n')
+            request_id = None
+            query = line
+            if line.startswith('{'):
+                try:
+                    request = json.loads(line)
+                    request_id = request.get('id')
+                    query = request.get('q')
+                except ValueError:
+                    pass
+            task = loop.create_task(resolver.resolve(query))
+            await results.put((request_id,task))
+        await results.put(None)
+
+    reader = loop.create_task(read())
+    while True:
+        item = await results.get()
+        if item is None:
+            break
+        request_id,task = item
+        try:
+            result = await task
+        except Exception as e:
+            result = {'error':str(e)}
+        if request_id is not None:
+            result = {'id':request_id,'result':result}
+        fout.write(json_bytes(result).decode('utf-8'))
+        if results.empty():
+            fout.flush()
+    fout.flush()
+    await reader
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='geostring-serve',
+        description='Serve geostring.resolve over local HTTP or '
+                    'stdin/stdout with a long-lived location index.')
+    parser.add_argument('--stdio',action='store_true',
+                        help='read one location per line on stdin and '
+                             'write JSON results to stdout instead of '
+                             'serving HTTP')
+    parser.add_argument('--host',default='127.0.0.1')
+    parser.add_argument('--port',type=int,default=8765)
+    parser.add_argument('--shared-index',
+                        help='serve a file written by export_shared_index')
+    parser.add_argument('-d','--delimiter',action='append',
+                        dest='delimiters',
+                        help='segment delimiter regex; repeat for several '
+                             '(default: the Geostring delimiters)')
+    parser.add_argument('-t','--max-tolerance',type=float,default=0.25)
+    parser.add_argument('-e','--exact',action='store_true')
+    parser.add_argument('--engine',choices=sorted(FUZZY_ENGINES),
+                        default='partition')
+    parser.add_argument('--max-batch',type=int,default=256)
+    parser.add_argument('--max-delay-ms',type=float,default=5.0)
+    parser.add_argument('-w','--workers',type=int,default=1)
+    parser.add_argument('--processes',action='store_true',
+                        help='run batches in worker processes instead of '
+                             'a thread')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.shared_index:
+        use_shared_index(args.shared_index)
+    loc_index = Geostring.loc_index
+    resolver = AsyncResolver(exact=args.exact,
+                             max_tolerance=args.max_tolerance,
+                             delimiters=args.delimiters or DEFAULT_DELIMITERS,
+                             loc_index=loc_index,
+                             engine=args.engine,
+                             max_batch=args.max_batch,
+                             max_delay=args.max_delay_ms/1000,
+                             workers=args.workers,
+                             processes=args.processes)
+    resolver.warm_up()
+
+    async def run():
+        try:
+            if args.stdio == True:
+                await serve_stdio(resolver)
+            else:
+                print('geostring: serving on http://%s:%d' %
+                      (args.host,args.port),file=sys.stderr,flush=True)
+                await serve_http(resolver,args.host,args.port)
+        finally:
+            await resolver.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+import array
+import bisect
+import collections.abc
+import json
+import mmap
+import os
+import sys
+import tempfile
+from .fuzzy import PartitionIndex
+from .places import PlaceRecord, PlaceStore
+
+# A location index laid out as flat arrays in one read-only file that
+# processes map into memory. Every process that opens the same file shares
+# the operating system's single copy of its pages, so N workers cost one
+# index rather than N, and nothing is unpickled or rebuilt on open. The
+# file holds the keys, the interned place names, each key's fields as name
+# ids, the name relations resolve needs, and the length buckets the
+# partition engine scans; SharedIndex, SharedPlaceStore and
+# SharedPartitionIndex read them in place. Keys are ASCII (create_loc_index
+# unidecodes them), so byte offsets into the key blob are string offsets.
+
+SHARED_FORMAT = 1
+SHARED_MAGIC = b'GEOSTRING-SHARED\n'
+
+UINT_MAX = 2**32 - 1
+
+def _uint_array(values):
+    # offsets, ids and ranks are stored as 32-bit unsigned ints
+    if len(values) > 0 and max(values) > UINT_MAX:
+        raise ValueError('This index is too large for a shared index; its '
+                         'sections are limited to 4 GiB and 2**32 entries')
+    return array.array('I',values)
+
+def _offsets(lengths):
+    starts = [0]
+    for i in lengths:
+        starts.append(starts[-1] + i)
+    return starts
+
+def export_shared_index(path,loc_index,re_sub='[^a-z]'):
+    # writes loc_index to path in the shared layout; re_sub must be the
+    # one used to build loc_index
+    keys = list(loc_index)
+    key_bytes = []
+    for i in keys:
+        try:
+            key_bytes.append(i.encode('ascii'))
+        except UnicodeEncodeError:
+            raise ValueError('Shared indexes need ASCII keys; "' + i +
+                             '" is not')
+    store = PlaceStore(loc_index,re_sub)
+    sections = collections.OrderedDict()
+    sections['key_blob'] = b'\n'.join(key_bytes)
+    sections['key_starts'] = _uint_array(_offsets([len(i)+1
+                                                   for i
+                                                   in key_bytes])[:-1])
+    sections['key_lengths'] = _uint_array([len(i) for i in key_bytes])
+    sections['sorted_ranks'] = _uint_array(sorted(range(len(keys)),
+                                                  key=key_bytes.__getitem__))
+    by_length = sorted(range(len(keys)),key=lambda n: (len(keys[n]),n))
+    sections['length_blob'] = b''.join([key_bytes[n] for n in by_length])
+    sections['length_ranks'] = _uint_array(by_length)
+    lengths = sorted(set(len(i) for i in keys))
+    sorted_lengths = [len(keys[n]) for n in by_length]
+    sections['bucket_lengths'] = _uint_array(lengths)
+    sections['bucket_starts'] = _uint_array(
+        [bisect.bisect_left(sorted_lengths,i) for i in lengths] +
+        [len(keys)])
+    names = [i.encode('utf-8') for i in store.names]
+    sections['name_blob'] = b''.join(names)
+    sections['name_starts'] = _uint_array(_offsets([len(i) for i in names]))
+    fields = []
+    for i in keys:
+        record = store.records[i]
+        fields.extend([record.cities,record.subcountries,record.countries])
+    sections['field_starts'] = _uint_array(_offsets([len(i) for i in fields]))
+    sections['field_ids'] = _uint_array([i for field in fields for i in field])
+    for name,relation in [('subcountries',store.subcountries_of),
+                          ('countries',store.countries_of)]:
+        relation = [sorted(i) for i in relation]
+        sections[name + '_starts'] = _uint_array(
+            _offsets([len(i) for i in relation]))
+        sections[name + '_ids'] = _uint_array([i
+                                               for ids
+                                               in relation
+                                               for i
+                                               in ids])
+
+    header = {'format':SHARED_FORMAT,
+              'byteorder':sys.byteorder,
+              're_sub':re_sub,
+              'keys':len(keys),
+              'names':len(names),
+              'max_len':max(lengths) if lengths else 0,
+              'sections':collections.OrderedDict()}
+    # section offsets are relative to the end of the header and 8-byte
+    # aligned, so the uint arrays can be cast in place
+    pos = 0
+    for name,data in sections.items():
+        if isinstance(data,array.array):
+            data = data.tobytes()
+            sections[name] = data
+        size = len(data)
+        header['sections'][name] = (pos,size)
+        pos += size + (-size % 8)
+    header = json.dumps(header).encode('utf-8')
+    header += b' '*(-(len(SHARED_MAGIC)+8+len(header)) % 8)
+
+    tmp_path = None
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        fd,tmp_path = tempfile.mkstemp(dir=directory,prefix='.tmp-')
+        with os.fdopen(fd,'wb') as f:
+            f.write(SHARED_MAGIC)
+            f.write(len(header).to_bytes(8,'little'))
+            f.write(header)
+            for data in sections.values():
+                f.write(data)
+                f.write(b'\0'*(-len(data) % 8))
+        os.replace(tmp_path,path)
+    except BaseException:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def open_shared_index(path):
+    return SharedIndex(path)
+
+class _MappedBlob(object):
+    # a window of the map, sliced with offsets relative to the window
+    def __init__(self,mm,offset,size):
+        self.mm = mm
+        self.offset = offset
+        self.size = size
+
+    def __getitem__(self,s):
+        return self.mm[self.offset+s.start:self.offset+s.stop]
+
+    def __len__(self):
+        return self.size
+
+class _Keys(collections.abc.Sequence):
+    # key strings by rank, decoded from the key blob on access
+    def __init__(self,index):
+        self.blob = index._blob
+        self.starts = index._starts
+        self.lengths = index._lengths
+
+    def __getitem__(self,rank):
+        start = self.starts[rank]
+        return self.blob[start:start+self.lengths[rank]].decode('ascii')
+
+    def __len__(self):
+        return len(self.starts)
+
+class _BucketKeys(collections.abc.Sequence):
+    # the keys of one length, stored back to back at a fixed width
+    def __init__(self,blob,offset,width,count):
+        self.blob = blob
+        self.offset = offset
+        self.width = width
+        self.count = count
+
+    def __getitem__(self,n):
+        if n < 0 or n >= self.count:
+            raise IndexError(n)
+        start = self.offset + n*self.width
+        return self.blob[start:start+self.width].decode('ascii')
+
+    def __iter__(self):
+        # one slice per bucket; the copy lasts only as long as the scan
+        width = self.width
+        text = self.blob[self.offset:self.offset+self.count*width].decode(
+            'ascii')
+        return iter([text[i:i+width] for i in range(0,len(text),width)])
+
+    def __len__(self):
+        return self.count
+
+class _Buckets(object):
+    # length -> (keys,ranks), as PartitionIndex.buckets
+    def __init__(self,index):
+        self.blob = index._section('length_blob')
+        self.ranks = index._uints('length_ranks')
+        self.lengths = index._uints('bucket_lengths')
+        self.starts = index._uints('bucket_starts')
+        self.slots = {length:n for n,length in enumerate(self.lengths)}
+        offsets = [0]
+        for n,length in enumerate(self.lengths):
+            offsets.append(offsets[-1] +
+                           length*(self.starts[n+1]-self.starts[n]))
+        self.offsets = offsets
+
+    def __contains__(self,length):
+        return length in self.slots
+
+    def __getitem__(self,length):
+        n = self.slots[length]
+        start,end = self.starts[n],self.starts[n+1]
+        return (_BucketKeys(self.blob,self.offsets[n],length,end-start),
+                self.ranks[start:end])
+
+    def __iter__(self):
+        return iter(self.slots)
+
+class _Relations(collections.abc.Sequence):
+    # name id -> frozenset of related name ids
+    def __init__(self,starts,ids):
+        self.starts = starts
+        self.ids = ids
+
+    def __getitem__(self,n):
+        return frozenset(self.ids[self.starts[n]:self.starts[n+1]])
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+class _Names(collections.abc.Sequence):
+    def __init__(self,blob,starts):
+        self.blob = blob
+        self.starts = starts
+
+    def __getitem__(self,n):
+        return self.blob[self.starts[n]:self.starts[n+1]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+class _Records(collections.abc.Mapping):
+    # key -> PlaceRecord, read from the field ids of its rank
+    def __init__(self,index):
+        self.index = index
+
+    def __getitem__(self,key):
+        rank = self.index._rank(key)
+        if rank is None:
+            raise KeyError(key)
+        return PlaceRecord(*self.index._fields(rank))
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+class SharedPlaceStore(object):
+    # the PlaceStore interface over a shared index
+    def __init__(self,index):
+        self.re_sub = index.re_sub
+        self.names = index._names
+        self.records = _Records(index)
+        self.subcountries_of = _Relations(index._uints('subcountries_starts'),
+                                          index._uints('subcountries_ids'))
+        self.countries_of = _Relations(index._uints('countries_starts'),
+                                       index._uints('countries_ids'))
+        self._name_ids = None
+
+    @property
+    def name_ids(self):
+        # only needed to look names up (regions); built on first use
+        if self._name_ids is None:
+            self._name_ids = {name:n for n,name in enumerate(self.names)}
+        return self._name_ids
+
+    def join(self,ids):
+        return '?'.join([self.names[i] for i in ids])
+
+class SharedPartitionIndex(PartitionIndex):
+    # PartitionIndex searching the mapped arrays instead of its own copies
+    def __init__(self,index):
+        self.keys = index._keys
+        self.key_set = index
+        self.lengths = index._lengths
+        self.starts = index._starts
+        self.blob = index._blob
+        self.buckets = _Buckets(index)
+        self.max_len = index._header['max_len']
+        self.max_candidates = max(int(len(self.keys)*self.candidate_ratio),1)
+
+    def candidates(self,query,k):
+        # PartitionIndex.candidates with the pieces found in the map
+        piece_len = len(query)//(k+1)
+        if piece_len < self.min_piece:
+            return None
+        mm = self.blob.mm
+        offset = self.blob.offset
+        end = offset + self.blob.size
+        cands = set()
+        for p in range(k+1):
+            if p < k:
+                piece = query[p*piece_len:(p+1)*piece_len]
+            else:
+                piece = query[p*piece_len:]
+            piece = piece.encode('ascii','replace')
+            i = mm.find(piece,offset,end)
+            while i != -1:
+                cands.add(bisect.bisect_right(self.starts,i-offset)-1)
+                if len(cands) > self.max_candidates:
+                    return None
+                i = mm.find(piece,i+1,end)
+        return cands
+
+class SharedIndex(collections.abc.Mapping):
+    # A read-only location index backed by a file written with
+    # export_shared_index. It can be passed as loc_index= anywhere a dict
+    # can; the partition engine and resolve's place store use the mapped
+    # arrays directly, other engines are built per process as usual.
+    def __init__(self,path):
+        self.path = path
+        with open(path,'rb') as f:
+            if f.read(len(SHARED_MAGIC)) != SHARED_MAGIC:
+                raise ValueError(path + ' is not a shared geostring index')
+            size = int.from_bytes(f.read(8),'little')
+            header = json.loads(f.read(size).decode('utf-8'))
+            if (header['format'] != SHARED_FORMAT
+                or header['byteorder'] != sys.byteorder):
+                raise ValueError(path + ' was written by an incompatible '
+                                 'version or platform; export it again')
+            self._base = len(SHARED_MAGIC) + 8 + size
+            self._mmap = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        self._header = header
+        self.re_sub = header['re_sub']
+        self._view = memoryview(self._mmap)
+        self._blob = self._section('key_blob')
+        self._starts = self._uints('key_starts')
+        self._lengths = self._uints('key_lengths')
+        self._sorted = self._uints('sorted_ranks')
+        self._field_starts = self._uints('field_starts')
+        self._field_ids = self._uints('field_ids')
+        self._names = _Names(self._section('name_blob'),
+                             self._uints('name_starts'))
+        self._keys = _Keys(self)
+        self.place_store = SharedPlaceStore(self)
+        self.shared_engines = {'partition':SharedPartitionIndex}
+
+    def _section(self,name):
+        offset,size = self._header['sections'][name]
+        return _MappedBlob(self._mmap,self._base+offset,size)
+
+    def _uints(self,name):
+        offset,size = self._header['sections'][name]
+        start = self._base + offset
+        return self._view[start:start+size].cast('I')
+
+    def _rank(self,key):
+        # binary search of the sorted key order
+        if not isinstance(key,str):
+            return None
+        try:
+            target = key.encode('ascii')
+        except UnicodeEncodeError:
+            return None
+        blob,starts,lengths,order = (self._blob,self._starts,
+                                     self._lengths,self._sorted)
+        lo,hi = 0,len(order)
+        while lo < hi:
+            mid = (lo+hi)//2
+            rank = order[mid]
+            start = starts[rank]
+            if blob[start:start+lengths[rank]] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order):
+            rank = order[lo]
+            start = starts[rank]
+            if blob[start:start+lengths[rank]] == target:
+                return rank
+        return None
+
+    def _fields(self,rank):
+        starts,ids = self._field_starts,self._field_ids
+        return tuple(tuple(ids[starts[3*rank+f]:starts[3*rank+f+1]])
+                     for f
+                     in range(3))
+
+    def __getitem__(self,key):
+        rank = self._rank(key)
+        if rank is None:
+            raise KeyError(key)
+        names = self._names
+        return ['?'.join([names[i] for i in field])
+                for field
+                in self._fields(rank)]
+
+    def __contains__(self,key):
+        return self._rank(key) is not None
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __eq__(self,other):
+        return self is other
+
+    __hash__ = object.__hash__
+
+    def __reduce__(self):
+        # processes that receive the index reopen the same file
+        return (open_shared_index,(self.path,))
+
+    def __repr__(self):
+        return 'SharedIndex(%r, keys=%d)' % (self.path,len(self))
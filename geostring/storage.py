@@ -0,0 +1,67 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+# On-disk artifacts for precompiled location indexes. Each artifact starts
+# with a magic line and a (format, key) header; the key hashes the source
+# files together with the arguments used to build the index, so editing a
+# CSV or changing re_sub/filters simply misses the cache.
+
+INDEX_FORMAT = 1
+MAGIC = b'GEOSTRING-INDEX\n'
+
+def cache_dir():
+    path = os.environ.get('GEOSTRING_CACHE_DIR','')
+    if path == '':
+        base = os.environ.get('XDG_CACHE_HOME','')
+        if base == '':
+            base = os.path.join(os.path.expanduser('~'),'.cache')
+        path = os.path.join(base,'geostring')
+    return path
+
+def index_key(paths,**params):
+    key_hash = hashlib.sha256()
+    key_hash.update(str(INDEX_FORMAT).encode('utf-8'))
+    for path in paths:
+        key_hash.update(b'\0')
+        if path:
+            with open(path,'rb') as f:
+                for block in iter(lambda: f.read(1 << 20),b''):
+                    key_hash.update(block)
+    key_hash.update(repr(sorted(params.items())).encode('utf-8'))
+    return key_hash.hexdigest()
+
+def artifact_path(name,key):
+    return os.path.join(cache_dir(),name + '-' + key[:32] + '.pickle')
+
+def read_artifact(path,key):
+    try:
+        with open(path,'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            if pickle.load(f) != (INDEX_FORMAT,key):
+                return None
+            return pickle.load(f)
+    except (OSError,EOFError,pickle.UnpicklingError,
+            AttributeError,ImportError,IndexError,ValueError):
+        return None
+
+def write_artifact(path,key,payload):
+    # written to a temporary file and renamed so that concurrent readers
+    # never see a partial artifact; an unwritable cache is not an error
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path),exist_ok=True)
+        fd,tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                       prefix='.tmp-')
+        with os.fdopen(fd,'wb') as f:
+            f.write(MAGIC)
+            pickle.dump((INDEX_FORMAT,key),f,pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload,f,pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path,path)
+        return True
+    except OSError:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
@@ -8,8 +8,11 @@ setup(
   author_email = 'dfreelon@gmail.com',
   url = 'https://github.com/dfreelon/geostring/', # use the URL to the github repo
   download_url = 'https://github.com/dfreelon/geostring/', 
-  install_requires = ['editdistance','pandas','unidecode'],
+  install_requires = ['editdistance','unidecode'],
   keywords = ['geographic', 'location', 'places', 'geolocation'], # arbitrary keywords
   classifiers = [],
-  include_package_data=True
+  include_package_data=True,
+  entry_points = {'console_scripts': ['geostring = geostring.cli:main',
+                                      'geostring-serve = geostring.service:main']},
+  extras_require = {'pandas': ['pandas']}
 )
\ No newline at end of file
@@ -0,0 +1,62 @@
+import math
+import pytest
+import geostring as geo
+
+INPUTS = ['Chapel Hill, NC',
+          'oxfrd, uk',
+          'chapel hill, nc',
+          'nowhere at all',
+          'Chapel Hill, NC',
+          'springfeld, ohio',
+          '',
+          'Zürich; Schweiz',
+          'paris / texas']
+
+def test_matches_resolve_in_input_order():
+    stats = {}
+    results = geo.resolve_many(INPUTS,stats=stats)
+    assert results == [geo.resolve(i) if i != '' else None for i in INPUTS]
+    assert results[0] is not results[4]
+    assert stats['inputs'] == len(INPUTS)
+    # the repeated input and the one that differs only by case
+    # preprocess to the same segments
+    assert stats['unique_inputs'] == len(set(INPUTS))
+    assert stats['unique_segments'] < stats['segments']
+
+def test_options_match_resolve():
+    for options in [{'exact':True},
+                    {'max_tolerance':0.4},
+                    {'engine':'symdelete'},
+                    {'delimiters':[';']}]:
+        assert (geo.resolve_many(INPUTS,**options) ==
+                [geo.resolve(i,**options) if i != '' else None
+                 for i
+                 in INPUTS]), options
+
+def test_non_strings_resolve_to_none():
+    results = geo.resolve_many([None,float('nan'),3,'oxford, uk'])
+    assert results[:3] == [None,None,None]
+    assert results[3]['resolved_country'] == 'united kingdom'
+
+def test_series_returns_a_dataframe():
+    pd = pytest.importorskip('pandas')
+    series = pd.Series(['oxford, uk',None,'durham, nc'],index=['a','b','c'])
+    frame = geo.resolve_many(series)
+    assert list(frame.columns) == ['resolved_city',
+                                   'resolved_subcountry',
+                                   'resolved_country']
+    assert list(frame.index) == ['a','b','c']
+    assert frame.loc['a','resolved_city'] == 'oxford'
+    assert frame.loc['c','resolved_subcountry'] == 'north carolina'
+    assert all(isinstance(i,float) and math.isnan(i) for i in frame.loc['b'])
+
+def test_workers_match_serial():
+    strings = ['%s, %s' % (a,b)
+               for a in ['oxfrd','durhm','sprngfield','brooklin','zzqx']
+               for b in ['uk','nc','ohio','new yrok']]
+    serial = geo.resolve_many(strings)
+    geo.segment_cache.clear()
+    assert geo.resolve_many(strings,workers=2) == serial
+    geo.segment_cache.clear()
+    with geo.resolver_pool(2) as pool:
+        assert geo.resolve_many(strings,pool=pool,chunksize=3) == serial
@@ -0,0 +1,6 @@
+from geostring.benchmark import FIXED_CASES
+from geostring.geostring import data_path, read_places_csv
+
+def test_fixed_nicknames_are_nicknames():
+    nicknames = {i[0] for i in read_places_csv(data_path('world_nicknames.csv'))}
+    assert [i for i in FIXED_CASES['nickname'] if i not in nicknames] == []
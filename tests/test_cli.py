@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_cli(args,stdin,cache_dir):
+    env = dict(os.environ,
+               GEOSTRING_CACHE_DIR=str(cache_dir),
+               PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable,'-m','geostring'] + args,
+                          input=stdin,
+                          capture_output=True,
+                          text=True,
+                          env=env,
+                          check=True)
+
+def test_cold_cache_keeps_stdout_clean(tmp_path):
+    # an empty cache directory makes the index get built during the run
+    src = tmp_path / 'in.csv'
+    src.write_text('id,location\n1,"Chapel Hill, NC"\n2,nowhere\n')
+    out = run_cli([str(src),'-c','location','-q'],'',tmp_path / 'cache')
+    rows = list(csv.reader(io.StringIO(out.stdout)))
+    assert rows[0] == ['id','location','resolved_city',
+                       'resolved_subcountry','resolved_country']
+    assert rows[1][:3] == ['1','Chapel Hill, NC','chapel hill']
+    assert len(rows) == 3
+    assert 'World index created.' in out.stderr
+
+def test_byte_order_mark_and_non_object_lines(tmp_path):
+    src = tmp_path / 'in.csv'
+    src.write_text('\ufefflocation\noxford\n',encoding='utf-8')
+    out = run_cli([str(src),'-c','location','-q'],'',tmp_path / 'cache')
+    rows = list(csv.reader(io.StringIO(out.stdout)))
+    assert rows[0][0] == 'location'
+    assert rows[1][:2] == ['oxford','oxford']
+    out = run_cli(['-','-f','csv','-c','location','-q'],
+                  '\ufefflocation\noxford\n',
+                  tmp_path / 'cache')
+    assert list(csv.reader(io.StringIO(out.stdout)))[1][:2] == ['oxford',
+                                                                'oxford']
+    lines = '{"location": "oxford"}\n[1]\n"oxford"\n'
+    out = run_cli(['-','-f','jsonl','-c','location','-q'],
+                  lines,
+                  tmp_path / 'cache')
+    rows = [json.loads(i) for i in out.stdout.splitlines()]
+    assert rows[0]['location'] == 'oxford'
+    assert rows[0]['resolved_city'] == 'oxford'
+    assert rows[1] == {'value':[1],
+                       'resolved_city':None,
+                       'resolved_subcountry':None,
+                       'resolved_country':None}
+    assert rows[2]['value'] == 'oxford'
+
+def test_start_row_appends(tmp_path):
+    src = tmp_path / 'in.csv'
+    src.write_text('id,location\n1,oxford\n2,durham\n3,paris\n')
+    dest = tmp_path / 'out.csv'
+    dest.write_text('id,location,resolved_city,resolved_subcountry,'
+                    'resolved_country\n1,oxford,oxford,england,'
+                    'united kingdom\n')
+    run_cli([str(src),'-c','location','-q','-o',str(dest),'--start-row','1'],
+            '',
+            tmp_path / 'cache')
+    rows = list(csv.reader(io.StringIO(dest.read_text())))
+    # the header is not written again and resumed rows follow the old ones
+    assert [i[0] for i in rows] == ['id','1','2','3']
+    assert rows[2][2] == 'durham'
+    assert rows[3][2] == 'paris'
+
+def test_workers_keep_input_order(tmp_path):
+    places = ['oxfrd','durhm','paris','london','zzqx','berlin','tokyo']
+    src = tmp_path / 'in.csv'
+    src.write_text('id,location\n' +
+                   ''.join('%d,%s\n' % (n,i) for n,i in enumerate(places)))
+    serial = run_cli([str(src),'-c','location','-q'],'',tmp_path / 'cache')
+    parallel = run_cli([str(src),'-c','location','-q',
+                        '--workers','2','--chunk-size','2'],
+                       '',
+                       tmp_path / 'cache')
+    rows = list(csv.reader(io.StringIO(parallel.stdout)))
+    assert [i[0] for i in rows[1:]] == [str(n) for n in range(len(places))]
+    assert parallel.stdout == serial.stdout
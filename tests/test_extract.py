@@ -0,0 +1,61 @@
+import random
+import geostring as geo
+from geostring.extract import PlaceMatcher, get_place_matcher, normalize_text
+
+def brute_force(norm,boundaries,keys):
+    return [(start,end,norm[start:end])
+            for n,start in enumerate(boundaries)
+            for end in boundaries[n+1:]
+            if norm[start:end] in keys]
+
+def test_find_matches_brute_force():
+    loc_index = geo.default_loc_index()
+    rng = random.Random(3)
+    words = rng.sample(list(loc_index),300) + ['the','of','new','york']
+    text = ' '.join(rng.choice(words) for i in range(400))
+    norm,offsets,boundaries = normalize_text(text)
+    assert (get_place_matcher(loc_index).find(norm,boundaries) ==
+            brute_force(norm,boundaries,loc_index))
+
+class CountingKeys(list):
+    # counts every key the matcher looks at, bisect probes included
+    probes = 0
+
+    def __getitem__(self,i):
+        CountingKeys.probes += 1
+        return list.__getitem__(self,i)
+
+def test_find_scales_linearly():
+    matcher = PlaceMatcher(geo.default_loc_index())
+    matcher.keys = CountingKeys(matcher.keys)
+    def probes(text):
+        norm,offsets,boundaries = normalize_text(text)
+        CountingKeys.probes = 0
+        matcher.find(norm,boundaries)
+        return CountingKeys.probes
+    text = 'Moved from Chapel Hill to the city of New York, NY. ' * 200
+    small = probes(text)
+    large = probes(text*8)
+    # 8x the text; a quadratic scan looks at ~64x as many keys
+    assert small > 0
+    assert large <= small*8 + small//100
+
+def test_prose_skips_short_keys_and_abbreviations():
+    text = 'I can go to India and Oregon or Paris in the spring'
+    hits = [i['geo_input_match'] for i in geo.extract_places(text)]
+    assert hits == ['india','oregon','paris']
+    hits = [i['geo_input_match']
+            for i
+            in geo.extract_places('Brooklyn, NY to NYC, Philly',
+                                  min_length=1,
+                                  abbreviations=True)]
+    assert hits == ['brooklyn','ny','to','nyc','philly']
+    hits = [i['geo_input_match']
+            for i
+            in geo.extract_places('Brooklyn, NY to NYC, Philly')]
+    assert hits == ['brooklyn','philly']
+
+def test_resolve_text_defaults():
+    resolved = geo.resolve_text('Springfield area, Ohio born')
+    assert resolved['resolved_city'] == 'springfield'
+    assert resolved['resolved_subcountry'] == 'ohio'
@@ -0,0 +1,99 @@
+import random
+import string
+import pytest
+import geostring as geo
+from geostring.fuzzy import (ExhaustiveIndex, PartitionIndex, SymDeleteIndex,
+                             max_edit_distance)
+
+def mutate(rng,s,edits):
+    for n in range(edits):
+        op = rng.choice('ids') if len(s) > 1 else 'i'
+        x = rng.randrange(len(s)) if len(s) > 0 else 0
+        if op == 'i':
+            s = s[:x] + rng.choice(string.ascii_lowercase) + s[x:]
+        elif op == 'd':
+            s = s[:x] + s[x+1:]
+        else:
+            s = s[:x] + rng.choice(string.ascii_lowercase) + s[x+1:]
+    return s
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = random.Random(20240601)
+    keys = list(geo.default_loc_index())
+    keys = [keys[i] for i in sorted(rng.sample(range(len(keys)),2500))]
+    queries = []
+    for n in range(300):
+        queries.append(mutate(rng,rng.choice(keys),rng.randrange(4)))
+    for n in range(30):
+        queries.append(''.join(rng.choice(string.ascii_lowercase)
+                               for i in range(rng.randrange(1,15))))
+    queries.extend(['','a','zz'])
+    return keys,queries
+
+@pytest.fixture(scope='module')
+def reference(corpus):
+    keys,queries = corpus
+    index = ExhaustiveIndex(keys)
+    results = {}
+    def search(q,max_distance):
+        if (q,max_distance) not in results:
+            results[(q,max_distance)] = index.search(q,max_distance)
+        return results[(q,max_distance)]
+    return search
+
+@pytest.mark.parametrize('engine',[PartitionIndex,SymDeleteIndex])
+@pytest.mark.parametrize('max_distance',[None,0,1,2,3,5])
+def test_engines_match_exhaustive(corpus,reference,engine,max_distance):
+    keys,queries = corpus
+    index = engine(keys)
+    for q in queries:
+        assert index.search(q,max_distance) == reference(q,max_distance), q
+
+@pytest.mark.parametrize('engine',[ExhaustiveIndex,
+                                   PartitionIndex,
+                                   SymDeleteIndex])
+def test_ties_go_to_first_key(engine):
+    keys = ['abcf','abcd','abce','abxdef','abcdefgh']
+    assert engine(keys).search('abcx',2) == ('abcf',1)
+    assert engine(keys[::-1]).search('abcx',2) == ('abce',1)
+    assert engine(keys).search('abcdefxx',None) == ('abcdefgh',2)
+    assert engine(keys).search('qqqqqqqqqqqq',1) == (None,None)
+
+@pytest.mark.parametrize('engine',[PartitionIndex,SymDeleteIndex])
+def test_ties_match_exhaustive_in_dense_buckets(engine):
+    rng = random.Random(7)
+    keys = list(dict.fromkeys(''.join(rng.choice('abc') for i in range(5))
+                              for n in range(200)))
+    reference = ExhaustiveIndex(keys)
+    index = engine(keys)
+    for n in range(200):
+        q = ''.join(rng.choice('abcd') for i in range(rng.randrange(2,8)))
+        for max_distance in [None,1,2,3]:
+            assert (index.search(q,max_distance) ==
+                    reference.search(q,max_distance)), (q,max_distance)
+
+def test_max_edit_distance_boundary():
+    assert max_edit_distance(10,None) is None
+    assert max_edit_distance(10,1) is None
+    assert max_edit_distance(10,-0.1) == -1
+    assert max_edit_distance(10,0) == 0
+    # 0.25*len/0.75: exactly 1 at length 3, still 0 just below
+    assert max_edit_distance(3,0.25) == 1
+    assert max_edit_distance(2,0.25) == 0
+    assert max_edit_distance(6,0.25) == 2
+    assert max_edit_distance(5,0.25) == 1
+    assert max_edit_distance(4,0.2) == 1
+    assert max_edit_distance(3,0.2) == 0
+
+def test_max_edit_distance_keeps_every_match_within_tolerance():
+    # every (query, key) pair within max_tolerance must be within the cutoff
+    for t in [0.1,0.2,0.25,1/3,0.4,0.5]:
+        for lq in range(0,30):
+            cutoff = max_edit_distance(lq,t)
+            for d in range(0,30):
+                for lk in range(max(lq-d,0),lq+d+1):
+                    if lk == 0 and lq == 0:
+                        continue
+                    if d/max(lq,lk) <= t:
+                        assert d <= cutoff, (t,lq,lk,d)
@@ -0,0 +1,115 @@
+import copy
+import random
+import sys
+import threading
+import pytest
+import geostring as geo
+from geostring.fuzzy import PartitionIndex, get_fuzzy_index
+from geostring.geostring import data_path
+
+@pytest.fixture
+def gi():
+    return geo.load_gazetteer(data_path('world_places.csv'),
+                              data_path('world_nicknames.csv'))
+
+def snapshot(gi):
+    gazetteer = gi.gazetteer
+    return (dict(gi),
+            gi.version,
+            copy.deepcopy([gazetteer.cities,
+                           gazetteer.subcountries,
+                           gazetteer.countries,
+                           gazetteer.nicknames]))
+
+def test_failed_edit_changes_nothing(gi):
+    before = snapshot(gi)
+    with pytest.raises(KeyError):
+        gi.edit(remove_places=[('durham',None,None),
+                               ('nowhereville',None,None)])
+    assert 'durham' in gi.gazetteer.cities
+    assert snapshot(gi) == before
+    # a removal that only fails because an earlier one took its rows
+    with pytest.raises(KeyError):
+        gi.edit(remove_places=[('durham',None,None),
+                               ('durham','united states',None)],
+                add_places=[('newtown','united states','ohio')])
+    with pytest.raises(KeyError):
+        gi.edit(remove_nicknames=[('nyc',None,None,None),
+                                  ('nyc',None,None,None)])
+    assert snapshot(gi) == before
+    # bad rows to add are refused before the removals are applied
+    for places,error in [([('x','y')],ValueError),
+                         ([('x','y','z','w')],ValueError),
+                         (['xyz'],ValueError),
+                         ([('x',None,'z')],TypeError),
+                         ([('x','y',3)],TypeError)]:
+        with pytest.raises(error):
+            gi.edit(remove_places=[('durham',None,None)],add_places=places)
+        assert snapshot(gi) == before
+    with pytest.raises(ValueError):
+        gi.edit(remove_places=[('durham',None,None)],
+                add_nicknames=[('big fake','fakeville','united states')])
+    with pytest.raises(ValueError):
+        gi.edit(remove_places=[('durham',None)])
+    assert snapshot(gi) == before
+
+def test_edits_match_a_fresh_build(gi):
+    # build the engines and place data first, so the edit updates them
+    engines = {engine:get_fuzzy_index(gi,engine)
+               for engine
+               in ['exhaustive','partition','symdelete']}
+    geo.resolve('durham, nc',loc_index=gi)
+    gi.edit(remove_places=[('durham','united states',None)],
+            remove_nicknames=[('nyc',None,None,None)],
+            add_places=[('Fakeville','United States','Ohio'),
+                        ('Durham','United States','Maine')],
+            add_nicknames=[('Big Fake','Fakeville','United States','Ohio')])
+    fresh = gi.gazetteer.build()
+    assert dict(gi) == fresh
+    assert gi['durham'][1] == 'maine'
+    assert 'nyc' not in gi
+    for engine in ['exhaustive','partition','symdelete']:
+        for q in ['fakevile','durhm','bigfake','nyc','new york']:
+            assert (geo.resolve(q,engine=engine,loc_index=gi) ==
+                    geo.resolve(q,engine=engine,loc_index=fresh)), (engine,q)
+        # updated in place, not rebuilt
+        assert get_fuzzy_index(gi,engine) is engines[engine]
+
+def test_searches_during_edits():
+    # keys ahead of the best match are removed from its length bucket while
+    # other threads scan that bucket; a search must never pair a distance
+    # with the wrong key
+    rng = random.Random(5)
+    filler = list(dict.fromkeys(''.join(rng.choice('mnopqr') for i in range(6))
+                                for n in range(3000)))
+    index = PartitionIndex(filler + ['abcdef'])
+    # too far from every key for the candidate filter, so these scan
+    queries = ['abcxyz','xbcdxz','abzzzz']
+    expected = [index.search(q) for q in queries]
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                for q,e in zip(queries,expected):
+                    found = index.search(q)
+                    if found != e:
+                        errors.append((q,found,e))
+            except Exception as e:
+                errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    threads = [threading.Thread(target=search) for n in range(2)]
+    try:
+        for t in threads:
+            t.start()
+        for i in filler:
+            index.apply_changes(None,[],[i],[])
+    finally:
+        done.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(interval)
+    assert errors == []
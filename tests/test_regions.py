@@ -0,0 +1,48 @@
+import contextlib
+import io
+import pytest
+import geostring as geo
+from geostring.geostring import create_loc_index, data_path
+
+def rebuilt(**filters):
+    with contextlib.redirect_stderr(io.StringIO()):
+        return create_loc_index(**filters)
+
+@pytest.mark.parametrize('filters',[
+    {'countries':['united states']},
+    {'countries':['georgia']},
+    {'subcountries':['ohio']},
+    {'countries':['united kingdom'],'subcountries':['texas']},
+    {'cities':['ontario'],'countries':['canada'],'subcountries':['georgia']},
+])
+def test_view_matches_rebuilt_index(filters):
+    old = rebuilt(**filters)
+    view = geo.region(**filters)
+    assert set(view) == set(old)
+    assert {i:view[i] for i in view} == old
+
+def test_shared_names_do_not_leak_across_regions():
+    georgia = geo.region(countries=['georgia'])
+    assert georgia['georgia'] == ['','','georgia']
+    assert geo.resolve('georgia',loc_index=georgia)['resolved_subcountry'] == ''
+    us = geo.region(countries=['united states'])
+    assert geo.resolve('ontario',loc_index=us)['resolved_subcountry'] == (
+        'california')
+    assert geo.resolve('woodstock',loc_index=us)['resolved_subcountry'] == (
+        'georgia?illinois')
+    mixed = geo.region(countries=['united kingdom'],subcountries=['texas'])
+    resolved = geo.resolve('aberdeen',loc_index=mixed)
+    assert resolved['resolved_subcountry'] == 'scotland'
+    assert resolved['resolved_country'] == 'united kingdom'
+
+def test_gazetteer_index_regions():
+    gi = geo.load_gazetteer(data_path('world_places.csv'),
+                            data_path('world_nicknames.csv'))
+    view = geo.region(countries=['united states'],loc_index=gi)
+    assert {i:view[i] for i in view} == rebuilt(countries=['united states'])
+    gi.add_place('Fakeville','United States','Ohio')
+    assert 'fakeville' in geo.region(countries=['united states'],loc_index=gi)
+
+def test_index_without_rows_is_rejected():
+    with pytest.raises(ValueError):
+        geo.region(countries=['x'],loc_index={'x':['','','x']})
@@ -0,0 +1,106 @@
+import threading
+import pytest
+import geostring as geo
+from geostring.geostring import compiled_resolver
+
+INPUTS = ['Chapel Hill, NC',
+          'oxfrd, uk',
+          'springfeld, ohio',
+          'Brooklyn, baby!',
+          'VA/MD',
+          'paris; texas',
+          'narnia',
+          'xyzqwv, zzqx',
+          '',
+          'Zürich',
+          'São Paulo, Brasil',
+          'Montréal / Québec',
+          'Köln; Deutschland',
+          '北京']
+
+OPTIONS = [{},
+           {'exact':True},
+           {'max_tolerance':0.4},
+           {'engine':'symdelete'},
+           {'delimiters':[',',';']}]
+
+@pytest.fixture(autouse=True)
+def restore():
+    yield
+    geo.restore_locations()
+
+def reference(loc_string,verbose=False,loc_index='',**options):
+    # resolve as Geostring followed by resolve_results
+    exact = options.get('exact',False)
+    max_tolerance = 0 if exact == True else options.get('max_tolerance',0.25)
+    geostr = geo.Geostring(loc_string,
+                           delimiters=options.get('delimiters',
+                                                  geo.DEFAULT_DELIMITERS),
+                           loc_index=loc_index,
+                           exact=exact,
+                           max_tolerance=max_tolerance,
+                           engine=options.get('engine','partition'))
+    return geo.resolve_results(geostr.results,
+                               max_tolerance,
+                               geostr.loc_index,
+                               geostr.re_sub,
+                               verbose)
+
+def test_matches_geostring_and_resolve_results():
+    for options in OPTIONS:
+        resolver = geo.Resolver(**options)
+        for s in INPUTS:
+            expected = reference(s,**options)
+            assert resolver.resolve(s) == expected, (options,s)
+            assert geo.resolve(s,**options) == expected, (options,s)
+
+def test_verbose_output_matches(capsys):
+    messages = []
+    for options in OPTIONS[:3]:
+        resolver = geo.Resolver(**options)
+        for s in INPUTS:
+            expected = reference(s,True,**options)
+            printed = capsys.readouterr().out
+            assert resolver.resolve(s,verbose=True) == expected
+            assert capsys.readouterr().out == printed, (options,s)
+            messages.append(printed)
+    printed = ''.join(messages)
+    assert 'No match for' in printed
+    assert 'equals or exceeds max tolerance' in printed
+    assert 'No results' in printed
+
+def test_pinned_and_call_time_indexes():
+    uk = geo.region(countries=['united kingdom'])
+    us = geo.region(countries=['united states'])
+    pinned = geo.Resolver(loc_index=uk)
+    default = geo.Resolver()
+    for s in ['oxfrd','durham','portland, maine']:
+        assert pinned.resolve(s) == reference(s,loc_index=uk)
+        assert pinned.resolve(s,loc_index=us) == reference(s,loc_index=us)
+        assert default.resolve(s) == reference(s)
+    # the default index is looked up at call time
+    geo.subset_locations(countries=['united states'])
+    assert default.resolve('oxfrd')['resolved_country'] == 'united states'
+    assert compiled_resolver().resolve('oxfrd') == default.resolve('oxfrd')
+    assert pinned.resolve('oxfrd')['resolved_country'] == 'united kingdom'
+    geo.restore_locations()
+    assert default.resolve('oxfrd') == reference('oxfrd')
+
+def test_threads_share_one_resolver():
+    resolver = geo.Resolver(max_tolerance=0.4)
+    expected = [reference(s,max_tolerance=0.4) for s in INPUTS]
+    errors = []
+
+    def run():
+        for n in range(20):
+            geo.segment_cache.clear()
+            found = [resolver.resolve(s) for s in INPUTS]
+            if found != expected:
+                errors.append(found)
+
+    threads = [threading.Thread(target=run) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
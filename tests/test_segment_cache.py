@@ -0,0 +1,69 @@
+import pytest
+import geostring as geo
+
+FUZZY = ['zqxa','qqzv','wxkp']
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    geo.segment_cache.clear()
+    geo.segment_cache.reset_stats()
+    yield
+    geo.restore_locations()
+
+def counts():
+    stats = geo.segment_cache.stats()
+    return stats['hits'],stats['misses'],stats['size']
+
+def test_resolve_counts_each_lookup_once():
+    geo.resolve(', '.join(FUZZY))
+    assert counts() == (0,3,3)
+    geo.resolve(', '.join(FUZZY))
+    assert counts() == (3,3,3)
+    # exact keys never reach the cache
+    geo.resolve('oxford, durham')
+    assert counts() == (3,3,3)
+
+def test_geostring_counts_each_lookup_once():
+    geo.Geostring(', '.join(FUZZY))
+    assert counts() == (0,3,3)
+    geo.Geostring(FUZZY[0])
+    assert counts() == (1,3,3)
+
+def test_resolve_many_counts_each_lookup_once():
+    geo.resolve_many([', '.join(FUZZY),FUZZY[0],'oxford'])
+    assert counts() == (0,3,3)
+    geo.resolve_many([', '.join(FUZZY)])
+    assert counts() == (3,3,3)
+    geo.segment_cache.clear()
+    geo.segment_cache.reset_stats()
+    geo.resolve_many([', '.join(FUZZY)],workers=2)
+    assert counts() == (0,3,3)
+
+def test_hit_rate_and_exact_mode():
+    geo.resolve(FUZZY[0])
+    geo.resolve(FUZZY[0])
+    assert geo.segment_cache.stats()['hit_rate'] == 0.5
+    geo.resolve(FUZZY[1],exact=True)
+    geo.resolve_many([FUZZY[1]],exact=True)
+    assert counts() == (1,1,1)
+
+def test_subset_and_restore_invalidate(capsys):
+    geo.resolve('oxfrd')
+    assert counts()[2] == 1
+    geo.subset_locations(countries=['united states'])
+    assert counts()[2] == 0
+    us = geo.resolve('oxfrd')
+    assert counts()[1:] == (2,1)
+    geo.restore_locations()
+    assert counts()[2] == 0
+    assert geo.resolve('oxfrd') != us
+    assert counts()[1:] == (3,1)
+
+def test_different_indexes_do_not_share_entries():
+    uk = geo.region(countries=['united kingdom'])
+    us = geo.region(countries=['united states'])
+    a = geo.resolve('oxfrd',loc_index=uk)
+    b = geo.resolve('oxfrd',loc_index=us)
+    assert a['resolved_country'] == 'united kingdom'
+    assert b['resolved_country'] == 'united states'
+    assert counts() == (0,2,2)
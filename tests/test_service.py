@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+from geostring import batch
+from geostring.index_cache import derived_cache
+from geostring.service import AsyncResolver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_stdio_cold_cache_writes_only_json(tmp_path):
+    env = dict(os.environ,
+               GEOSTRING_CACHE_DIR=str(tmp_path / 'cache'),
+               PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable,'-m','geostring.service','--stdio'],
+                         input='Chapel Hill, NC\n{"id": 7, "q": "oxford, uk"}\n',
+                         capture_output=True,
+                         text=True,
+                         env=env,
+                         timeout=120,
+                         check=True)
+    lines = [json.loads(i) for i in out.stdout.splitlines()]
+    assert lines[0]['resolved_city'] == 'chapel hill'
+    assert lines[1]['id'] == 7
+    assert lines[1]['result']['resolved_country'] == 'united kingdom'
+    assert len(lines) == 2
+    assert 'World index created.' in out.stderr
+
+LOC_INDEX = {'oxford':['oxford','england','united kingdom'],
+             'durham':['durham','north carolina','united states'],
+             'england':['','england','united kingdom']}
+
+def built(loc_index):
+    return sorted(name
+                  for (loc_id,name),cached
+                  in derived_cache.entries.items()
+                  if cached[0] is loc_index)
+
+def worker_built():
+    return built(batch._worker_loc_index)
+
+def test_warm_up_builds_engine_and_place_store():
+    loc_index = dict(LOC_INDEX)
+    resolver = AsyncResolver(loc_index=loc_index,engine='exhaustive')
+    resolver.warm_up()
+    assert built(loc_index) == [('fuzzy','exhaustive'),('places','[^a-z]')]
+    assert built(dict(LOC_INDEX)) == []
+
+def test_warm_up_builds_in_every_worker():
+    resolver = AsyncResolver(loc_index=dict(LOC_INDEX),
+                             engine='exhaustive',
+                             workers=2,
+                             processes=True)
+    try:
+        resolver.warm_up()
+        # each worker warmed up before it ran anything
+        results = [resolver.executor.submit(worker_built) for n in range(4)]
+        assert [i.result() for i in results] == [[('fuzzy','exhaustive'),
+                                                  ('places','[^a-z]')]]*4
+    finally:
+        resolver.executor.shutdown()
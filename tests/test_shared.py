@@ -0,0 +1,67 @@
+import random
+import string
+import pytest
+import geostring as geo
+from geostring.fuzzy import PartitionIndex
+from geostring.shared import (SharedPartitionIndex, _uint_array,
+                              export_shared_index, open_shared_index)
+
+@pytest.fixture(scope='module')
+def shared(tmp_path_factory):
+    path = tmp_path_factory.mktemp('shared') / 'world.geoidx'
+    return open_shared_index(export_shared_index(str(path),
+                                                 geo.default_loc_index()))
+
+def test_round_trip(shared):
+    loc_index = geo.default_loc_index()
+    assert list(shared) == list(loc_index)
+    assert len(shared) == len(loc_index)
+    assert all(shared[i] == loc_index[i] for i in loc_index)
+    store = shared.place_store
+    assert all(store.join(store.records[i].cities) == loc_index[i][0]
+               for i
+               in loc_index)
+
+def test_rank_finds_every_key_and_no_other(shared):
+    keys = list(shared)
+    assert [shared._rank(i) for i in keys] == list(range(len(keys)))
+    ordered = sorted(keys)
+    missing = ['','zzzzzzzzzz',ordered[0][:-1],ordered[-1] + 'a',
+               'chapelhil','chapelhilla','zürich',3,None]
+    missing += [i + 'qq' for i in keys[::500]]
+    for i in missing:
+        assert shared._rank(i) is None, i
+        assert i not in shared
+    with pytest.raises(KeyError):
+        shared['zzzzzzzzzz']
+
+def test_partition_engine_matches_dict_engine(shared):
+    rng = random.Random(8)
+    keys = list(shared)
+    queries = ['','a','zz','brookln','chicgo','lodnon','zürich']
+    for n in range(150):
+        key = list(rng.choice(keys))
+        for e in range(rng.randrange(3)):
+            key[rng.randrange(len(key))] = rng.choice(string.ascii_lowercase)
+        queries.append(''.join(key))
+    mapped = SharedPartitionIndex(shared)
+    plain = PartitionIndex(keys)
+    for q in queries:
+        for max_distance in [None,1,3]:
+            assert (mapped.search(q,max_distance) ==
+                    plain.search(q,max_distance)), (q,max_distance)
+
+def test_workers_reopen_the_shared_index(shared):
+    strings = ['%s, %s' % (a,b)
+               for a in ['oxfrd','durhm','sprngfield','zzqx']
+               for b in ['uk','nc','ohio','new yrok']]
+    expected = geo.resolve_many(strings)
+    geo.segment_cache.clear()
+    assert geo.resolve_many(strings,loc_index=shared) == expected
+    geo.segment_cache.clear()
+    assert geo.resolve_many(strings,loc_index=shared,workers=2) == expected
+
+def test_oversized_sections_are_refused():
+    assert list(_uint_array([0,2**32-1])) == [0,2**32-1]
+    with pytest.raises(ValueError):
+        _uint_array([0,2**32])